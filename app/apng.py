@@ -0,0 +1,132 @@
+"""Streaming animated PNG writer with inter-frame delta encoding."""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+DISPOSE_NONE = 0
+BLEND_SOURCE = 0
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def _encode_idat(rgba: np.ndarray, compress_level: int) -> bytes:
+    # Let Pillow do filtering and deflate, then lift the IDAT payload out of the PNG
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, "PNG", compress_level=compress_level)
+    data = buf.getvalue()
+    pos, idat = len(PNG_SIGNATURE), []
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        if tag == b"IDAT":
+            idat.append(data[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return b"".join(idat)
+
+
+class ApngWriter:
+    """Writes RGBA frames to an APNG one at a time, keeping full 8-bit alpha.
+
+    Each frame after the first only stores the bounding box of pixels that
+    changed since what the viewer is showing, drawn with the SOURCE blend op so
+    alpha can go down as well as up. RGB under alpha 0 is written as black. Unchanged frames extend the previous
+    frame's delay instead of being written. With threshold > 0, per-channel
+    changes up to that size are treated as unchanged (lossy).
+
+    The writer itself only holds one encoded frame, so it can be fed a stream.
+    """
+
+    def __init__(self, path, fps, loop=0, threshold=0, compress_level=6):
+        self.path = path
+        self.delay_ms = max(1, round(1000 / max(0.001, fps)))
+        self.loop = loop
+        self.threshold = threshold
+        self.compress_level = compress_level
+        self._fp = None
+        self._canvas = None
+        self._pending = None  # (x, y, w, h, idat, delay_ms)
+        self._seq = 0
+        self._frames = 0
+        self._actl_pos = 0
+
+    @property
+    def frame_count(self) -> int:
+        return self._frames + (self._pending is not None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def _start(self, h, w):
+        self._fp = open(self.path, "wb")
+        self._fp.write(PNG_SIGNATURE)
+        self._fp.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)))
+        # Frame count is patched in close() once we know how many were written
+        self._actl_pos = self._fp.tell()
+        self._fp.write(_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+
+    def add(self, frame: np.ndarray):
+        if frame.shape[2] == 3:
+            frame = np.dstack([frame, np.full(frame.shape[:2], 255, np.uint8)])
+        else:
+            # Colour under fully transparent pixels is invisible; zero it so leftover
+            # key colour neither widens the delta boxes nor costs bytes
+            hidden = frame[:, :, 3] == 0
+            if hidden.any():
+                frame = frame.copy()
+                frame[hidden, :3] = 0
+        h, w = frame.shape[:2]
+        if self._canvas is None:
+            self._start(h, w)
+            self._canvas = frame.copy()
+            self._pending = (0, 0, w, h, _encode_idat(frame, self.compress_level), self.delay_ms)
+            return
+        if frame.shape != self._canvas.shape:
+            raise ValueError("APNG frames must all be the same size")
+
+        diff = np.abs(frame.astype(np.int16) - self._canvas).max(axis=2) > self.threshold
+        cols = np.flatnonzero(diff.any(axis=0))
+        if cols.size == 0:
+            x, y, pw, ph, idat, delay = self._pending
+            self._pending = (x, y, pw, ph, idat, min(0xFFFF, delay + self.delay_ms))
+            return
+        rows = np.flatnonzero(diff.any(axis=1))
+        x1, x2, y1, y2 = cols[0], cols[-1] + 1, rows[0], rows[-1] + 1
+        region = np.ascontiguousarray(frame[y1:y2, x1:x2])
+        self._canvas[y1:y2, x1:x2] = region
+        self._flush()
+        self._pending = (int(x1), int(y1), int(x2 - x1), int(y2 - y1), _encode_idat(region, self.compress_level), self.delay_ms)
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        x, y, w, h, idat, delay = self._pending
+        fctl = struct.pack(">IIIIIHHBB", self._seq, w, h, x, y, delay, 1000, DISPOSE_NONE, BLEND_SOURCE)
+        self._fp.write(_chunk(b"fcTL", fctl))
+        self._seq += 1
+        if self._frames == 0:
+            self._fp.write(_chunk(b"IDAT", idat))
+        else:
+            self._fp.write(_chunk(b"fdAT", struct.pack(">I", self._seq) + idat))
+            self._seq += 1
+        self._frames += 1
+        self._pending = None
+
+    def close(self):
+        if self._fp is None:
+            return
+        self._flush()
+        self._fp.write(_chunk(b"IEND", b""))
+        self._fp.seek(self._actl_pos)
+        self._fp.write(_chunk(b"acTL", struct.pack(">II", self._frames, self.loop)))
+        self._fp.close()
+        self._fp = None
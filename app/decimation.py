@@ -0,0 +1,85 @@
+"""Motion-aware frame decimation for sprite sheet budgets."""
+
+import cv2
+import numpy as np
+
+
+def motion_signature(frame: np.ndarray, size=32) -> np.ndarray:
+    """Downsampled, alpha-premultiplied copy of a processed frame for motion scoring."""
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    if small.shape[2] == 4:
+        # Keyed-out pixels shouldn't register motion whatever colour they hold
+        small[:, :, :3] *= small[:, :, 3:] / 255.0
+    return small.ravel() / 255.0
+
+
+def motion_steps(signatures) -> np.ndarray:
+    """RMS change between each consecutive pair of signatures (length N - 1)."""
+    sigs = np.asarray(signatures, np.float32)
+    if len(sigs) < 2:
+        return np.zeros(0, np.float32)
+    return np.sqrt(np.mean(np.diff(sigs, axis=0) ** 2, axis=1))
+
+
+def select_frames(steps, target, time_weight=0.1) -> list:
+    """Pick `target` of the N = len(steps) + 1 frames, spaced evenly along accumulated motion.
+
+    Each kept frame then stands in for about the same amount of visual change,
+    so fast passages keep most of their frames and holds collapse to one.
+    time_weight (relative to the mean step) keeps slow drifts from being
+    dropped entirely. Always keeps frame 0; returns sorted positions.
+    """
+    steps = np.asarray(steps, np.float64)
+    n = len(steps) + 1
+    if target >= n:
+        return list(range(n))
+    if target <= 1:
+        return [0]
+    mean = steps.mean()
+    weights = (steps / mean if mean > 0 else np.zeros_like(steps)) + time_weight
+    # cum[k] is frame k's position along the motion curve; the last span wraps back to frame 0
+    cum = np.concatenate([[0.0], np.cumsum(weights)])
+    total = cum[-1] + (cum[-1] / (n - 1))
+    picks, prev = [], -1
+    for k, mark in enumerate(np.arange(target) * total / target):
+        idx = int(np.searchsorted(cum, mark))
+        if idx > 0 and (idx == n or mark - cum[idx - 1] < cum[idx] - mark):
+            idx -= 1
+        idx = min(max(idx, prev + 1), n - (target - k))
+        picks.append(idx)
+        prev = idx
+    return picks
+
+
+def frame_durations(positions, source_indices) -> list:
+    """How many source frames each kept frame stands for, from the gaps between kept source indices.
+
+    The last kept frame runs to the end of the selection plus one more step. If
+    the selection isn't in increasing order, source gaps are meaningless and
+    each selection step counts as one frame.
+    """
+    idx = list(source_indices)
+    if any(b <= a for a, b in zip(idx, idx[1:])):
+        idx = list(range(len(idx)))
+    last_step = idx[-1] - idx[-2] if len(idx) > 1 else 1
+    ends = [idx[p] for p in positions[1:]] + [idx[-1] + last_step]
+    return [end - idx[p] for p, end in zip(positions, ends)]
+
+
+def sheet_layout(count, frame_w, frame_h, max_w, max_h, columns=0):
+    """Largest frame count (<= count) and column count whose grid fits within max_w x max_h.
+
+    A requested column count wider than the sheet allows is narrowed to fit.
+    """
+    max_cols = max_w // frame_w
+    if columns > 0:
+        max_cols = min(max_cols, columns)
+    max_rows = max_h // frame_h
+    count = min(count, max_cols * max_rows)
+    if count <= 0:
+        return 0, columns
+    if columns > 0:
+        return count, max_cols
+    # Square-ish like the default grid, widened only as far as the height requires
+    cols = max(-(-count // max_rows), min(int(np.ceil(np.sqrt(count))), max_cols))
+    return count, cols
@@ -0,0 +1,173 @@
+"""Persistent, content-addressed cache for processed frames and exports.
+
+Entries are keyed by source file identity, frame index and the processor
+settings, so a re-export only processes frames whose inputs changed.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+# Bump when processing changes what a given key produces, so stale entries are never reused
+CACHE_VERSION = 3
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "spritespite" / "export"
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ExportCache:
+    """Disk-backed LRU cache with a total size cap.
+
+    Recency is tracked through file modification times, which are bumped on
+    every hit, so the ordering survives restarts without an index file.
+    """
+
+    FRAME_EXT = ".npy"
+    OUTPUT_EXT = ".bin"
+    EVICT_TO = 0.9  # eviction trims down to this fraction of max_bytes
+
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def source_key(self, file_path) -> Optional[str]:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return _digest(os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+
+    def frame_key(self, source_key, frame_index, settings_key) -> str:
+        return _digest("frame", CACHE_VERSION, source_key, frame_index, settings_key)
+
+    def output_key(self, kind, frame_keys, *options) -> str:
+        return _digest("output", CACHE_VERSION, kind, tuple(frame_keys), options)
+
+    def _path(self, key, ext) -> Path:
+        return self.cache_dir / key[:2] / (key + ext)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def fits(self, nbytes) -> bool:
+        # Caching a working set larger than this only writes and evicts, never hits
+        return nbytes <= self.max_bytes * self.EVICT_TO
+
+    def get_frame(self, key) -> Optional[np.ndarray]:
+        path = self._path(key, self.FRAME_EXT)
+        try:
+            frame = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return frame
+
+    def put_frame(self, key, frame: np.ndarray):
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(frame), allow_pickle=False)
+        self._write(self._path(key, self.FRAME_EXT), buf.getvalue())
+
+    def fetch_output(self, key, dest_path) -> bool:
+        """Copy a cached output file to dest_path. Returns False on a miss."""
+        path = self._path(key, self.OUTPUT_EXT)
+        if not path.is_file():
+            return False
+        try:
+            shutil.copyfile(path, dest_path)
+        except OSError:
+            return False
+        self._touch(path)
+        return True
+
+    def store_output(self, key, src_path):
+        try:
+            with open(src_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        self._write(self._path(key, self.OUTPUT_EXT), data)
+
+    def _write(self, path: Path, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        # Unique temp names let several export workers share one cache
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Export cache write failed: {e}")
+            return
+        with self._lock:
+            total = self._current_size()
+            try:
+                old_size = path.stat().st_size if path.exists() else 0
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Export cache write failed: {e}")
+                return
+            self._total_bytes = total - old_size + len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not self.cache_dir.is_dir():
+            return []
+        entries = []
+        for p in self.cache_dir.glob("*/*"):
+            if p.suffix not in (self.FRAME_EXT, self.OUTPUT_EXT):
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, p))
+        return entries
+
+    def _current_size(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        # Evict below the cap so we don't rescan on every write
+        target = int(self.max_bytes * self.EVICT_TO)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._total_bytes = 0
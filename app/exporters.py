@@ -4,28 +4,148 @@ import os
 import oxipng
 from PIL import Image
 from pathlib import Path
+from app.video_io import VideoLoader, ParallelFrameReader
+from app.apng import ApngWriter
+from app.decimation import motion_signature, motion_steps, select_frames, frame_durations, sheet_layout
+
+class AtlasClip:
+    # One named animation in an atlas export
+
+    def __init__(self, name, frame_indices, fps, source_path=None, loop=True):
+        self.name = name
+        self.frame_indices = list(frame_indices)
+        self.fps = fps
+        self.source_path = source_path
+        self.loop = loop
+
+
+class ExportVariant:
+    # One output of a fan-out export: a format, target size and path
+
+    def __init__(self, path, fmt, size=None, columns=0, max_colors=None, lossless=True, quality=80):
+        self.path = path
+        self.fmt = fmt
+        self.size = tuple(size) if size else None
+        self.columns = columns
+        self.max_colors = max_colors
+        self.lossless = lossless
+        self.quality = quality
+
+
+def _godot_escape(text):
+    return str(text).replace('\\', '\\\\').replace('"', '\\"')
+
 
 class SpriteExporter:
-    def __init__(self, video_loader, processor):
+    def __init__(self, video_loader, processor, cache=None, reader=None):
         self.video_loader = video_loader
         self.processor = processor
+        self.cache = cache
+        # Large uncached selections are decoded by several captures in parallel
+        self.parallel_workers = max(1, min(8, os.cpu_count() or 1))
+        self.parallel_threshold = 96
+        self.stream_bytes = 256 * 1024 * 1024  # processed frames a streaming export holds at once
+        self.shared_reader = reader  # owned by the caller, e.g. kept warm across jobs
+        self._reader = None
+
+    def _frame_bytes(self, size=None, video_loader=None):
+        video_loader = video_loader or self.video_loader
+        w, h = size or self.processor.frame_size(video_loader.width, video_loader.height)
+        return w * h * 4
 
-    def _get_processed_frames(self, frame_indices, progress_callback=None):
+    def _frame_keys(self, frame_indices, video_loader=None):
+        video_loader = video_loader or self.video_loader
+        if not self.cache or not video_loader.file_path:
+            return None
+        if not self.cache.fits(len(set(frame_indices)) * self._frame_bytes(None, video_loader)):
+            return None
+        source_key = self.cache.source_key(video_loader.file_path)
+        if source_key is None:
+            return None
+        settings = self.processor.settings_key()
+        return [self.cache.frame_key(source_key, idx, settings) for idx in frame_indices]
+
+    def _processed_frame(self, frame_idx, key=None, video_loader=None):
+        processed = self.cache.get_frame(key) if key else None
+        if processed is None:
+            raw_frame = (video_loader or self.video_loader).get_frame(frame_idx)
+            if raw_frame is not None:
+                processed = self.processor.process_frame(raw_frame)
+                if key:
+                    self.cache.put_frame(key, processed)
+        return processed
+
+    def _parallel_reader(self):
+        path = self.video_loader.file_path
+        if self.parallel_workers < 2 or not path:
+            return None
+        if self.shared_reader is not None and self.shared_reader.file_path == path:
+            return self.shared_reader
+        if self._reader is None or self._reader.file_path != path:
+            if self._reader:
+                self._reader.close()
+            self._reader = ParallelFrameReader(path, self.parallel_workers)
+        return self._reader
+
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    def _get_processed_frames(self, frame_indices, progress_callback=None, frame_keys=None):
+        reader = self._parallel_reader() if len(frame_indices) >= self.parallel_threshold else None
+        if reader:
+            return self._get_processed_frames_parallel(reader, frame_indices, progress_callback, frame_keys)
         frames = []
         total = len(frame_indices)
         for i, frame_idx in enumerate(frame_indices):
-            raw_frame = self.video_loader.get_frame(frame_idx)
-            if raw_frame is not None:
-                processed = self.processor.process_frame(raw_frame)
+            processed = self._processed_frame(frame_idx, frame_keys[i] if frame_keys else None)
+            if processed is not None:
                 frames.append(processed)
             if progress_callback:
                 progress_callback(int((i / total) * 100))
         return frames
 
+    def _iter_processed_frames(self, frame_indices, progress_callback=None, frame_keys=None):
+        # Yields frames one at a time so streaming writers never hold the whole clip
+        reader = self._parallel_reader() if len(frame_indices) >= self.parallel_threshold else None
+        total = len(frame_indices)
+        if reader:
+            # Decode in chunks of about stream_bytes, split evenly across the workers
+            step = max(reader.workers * 2, self.stream_bytes // self._frame_bytes())
+            for start in range(0, total, step):
+                part = slice(start, start + step)
+                yield from self._get_processed_frames_parallel(reader, frame_indices[part], None,
+                                                               frame_keys[part] if frame_keys else None,
+                                                               max(1, step // reader.workers))
+                if progress_callback:
+                    progress_callback(int((min(total, start + step) / total) * 100))
+            return
+        for i, frame_idx in enumerate(frame_indices):
+            processed = self._processed_frame(frame_idx, frame_keys[i] if frame_keys else None)
+            if processed is not None:
+                yield processed
+            if progress_callback:
+                progress_callback(int((i / total) * 100))
+
+    def _get_processed_frames_parallel(self, reader, frame_indices, progress_callback=None, frame_keys=None, min_segment=None):
+        results = [self.cache.get_frame(k) for k in frame_keys] if frame_keys else [None] * len(frame_indices)
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            decoded = reader.read([frame_indices[i] for i in missing], self.processor.process_frame, progress_callback, min_segment)
+            for i, processed in zip(missing, decoded):
+                results[i] = processed
+                if processed is not None and frame_keys:
+                    self.cache.put_frame(frame_keys[i], processed)
+        return [r for r in results if r is not None]
+
     def export_gif(self, path, frame_indices, fps, progress_callback=None):
-        frames = self._get_processed_frames(frame_indices, progress_callback)
+        frames = self._get_processed_frames(frame_indices, progress_callback, self._frame_keys(frame_indices))
         if not frames: return False
-        
+        self._write_gif(path, frames, fps)
+        return True
+
+    def _write_gif(self, path, frames, fps):
         pil_frames = [Image.fromarray(f) for f in frames]
         duration = int(1000 / max(1, fps))
         
@@ -37,12 +157,14 @@ class SpriteExporter:
             loop=0,
             disposal=2
         )
-        return True
 
     def export_mp4(self, path, frame_indices, fps, progress_callback=None):
-        frames = self._get_processed_frames(frame_indices, progress_callback)
+        frames = self._get_processed_frames(frame_indices, progress_callback, self._frame_keys(frame_indices))
         if not frames: return False
-        
+        self._write_mp4(path, frames, fps)
+        return True
+
+    def _write_mp4(self, path, frames, fps):
         h, w = frames[0].shape[:2]
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(path, fourcc, fps, (w, h))
@@ -65,17 +187,65 @@ class SpriteExporter:
             out.write(bgr)
             
         out.release()
+
+    def export_webp(self, path, frame_indices, fps, lossless=True, quality=80, progress_callback=None):
+        frames = self._get_processed_frames(frame_indices, progress_callback, self._frame_keys(frame_indices))
+        if not frames: return False
+        self._write_webp(path, frames, fps, lossless, quality)
         return True
 
-    def export_spritesheet(self, path, frame_indices, columns, progress_callback=None):
-        frames = self._get_processed_frames(frame_indices, progress_callback)
+    def _write_webp(self, path, frames, fps, lossless=True, quality=80):
+        # libwebp's animation encoder stores only the changed sub-rectangle of each frame
+        pil_frames = [Image.fromarray(f) for f in frames]
+        pil_frames[0].save(
+            path,
+            format="WEBP",
+            save_all=True,
+            append_images=pil_frames[1:],
+            duration=int(1000 / max(1, fps)),
+            loop=0,
+            lossless=lossless,
+            quality=quality,
+            alpha_quality=100,
+            method=4,
+            allow_mixed=not lossless,
+        )
+
+    def export_apng(self, path, frame_indices, fps, lossless=True, quality=80, progress_callback=None):
+        frames = self._iter_processed_frames(frame_indices, progress_callback, self._frame_keys(frame_indices))
+        return self._write_apng(path, frames, fps, lossless, quality)
+
+    def _write_apng(self, path, frames, fps, lossless=True, quality=80):
+        # Lossy mode ignores per-channel changes below a quality-scaled threshold
+        threshold = 0 if lossless else int(round((100 - quality) / 100 * 24))
+        # The writer only creates the file once the first frame arrives
+        with ApngWriter(path, fps, threshold=threshold) as writer:
+            for f in frames:
+                writer.add(f)
+        return writer.frame_count > 0
+
+    def export_spritesheet(self, path, frame_indices, columns, progress_callback=None, durations=None, fps=None):
+        frame_keys = self._frame_keys(frame_indices)
+        sheet_key = self.cache.output_key("spritesheet", frame_keys, columns) if frame_keys else None
+        if sheet_key and self._export_cached_sheet(path, len(frame_indices), columns, sheet_key, durations, fps):
+            return True
+
+        frames = self._get_processed_frames(frame_indices, progress_callback, frame_keys)
         if not frames: return False
+        if durations and len(durations) != len(frames):
+            durations = None
         
+        self._write_spritesheet(path, frames, columns, durations, fps)
+        # Only cache complete sheets so a hit reproduces the same metadata
+        if sheet_key and len(frames) == len(frame_indices):
+            self.cache.store_output(sheet_key, path)
+        return True
+
+    def _write_spritesheet(self, path, frames, columns, durations=None, fps=None):
         num_frames = len(frames)
         f_h, f_w = frames[0].shape[:2]
         
-        cols = columns if columns > 0 else int(np.ceil(np.sqrt(num_frames)))
-        rows = int(np.ceil(num_frames / cols))
+        cols, rows = self._grid_size(num_frames, columns)
         
         sheet_w = cols * f_w
         sheet_h = rows * f_h
@@ -101,17 +271,265 @@ class SpriteExporter:
         except Exception as e:
             print(f"oxipng optimization failed: {e}")
             
-        self._write_godot_meta(path, f_w, f_h, cols, rows, num_frames)
+        self._write_godot_meta(path, f_w, f_h, cols, rows, num_frames, durations, fps)
+
+    def plan_decimation(self, frame_indices, target=0, max_sheet=None, columns=0, progress_callback=None):
+        # Pick the frames to keep for the budget; returns {"frames", "durations", "columns"} or None if nothing fits
+        frame_keys = self._frame_keys(frame_indices)
+        kept, signatures, frame_size = [], [], None
+        total = len(frame_indices)
+        reader = self._parallel_reader() if total >= self.parallel_threshold else None
+        if reader:
+            kept, signatures = self._scan_signatures_parallel(reader, frame_indices, frame_keys, progress_callback)
+            frame_size = self.processor.frame_size(self.video_loader.width, self.video_loader.height)
+        else:
+            for i, frame_idx in enumerate(frame_indices):
+                processed = self._processed_frame(frame_idx, frame_keys[i] if frame_keys else None)
+                if processed is not None:
+                    kept.append(frame_idx)
+                    signatures.append(motion_signature(processed))
+                    frame_size = frame_size or (processed.shape[1], processed.shape[0])
+                if progress_callback:
+                    progress_callback(int((i / total) * 100))
+        if not kept: return None
+
+        budget = min(target, len(kept)) if target > 0 else len(kept)
+        if max_sheet:
+            budget, columns = sheet_layout(budget, frame_size[0], frame_size[1], max_sheet[0], max_sheet[1], columns)
+            if budget <= 0:
+                print(f"A {frame_size[0]}x{frame_size[1]} frame doesn't fit in a {max_sheet[0]}x{max_sheet[1]} sheet")
+                return None
+        positions = select_frames(motion_steps(signatures), budget)
+        return {
+            "frames": [kept[p] for p in positions],
+            "durations": frame_durations(positions, kept),
+            "columns": columns,
+        }
+
+    def _scan_signatures_parallel(self, reader, frame_indices, frame_keys, progress_callback=None):
+        # Signatures are computed on the decode workers; processed frames are only kept to fill the cache
+        def process(rgb):
+            processed = self.processor.process_frame(rgb)
+            return (processed if frame_keys else None), motion_signature(processed)
+        kept, signatures = [], []
+        total = len(frame_indices)
+        step = max(reader.workers * 2, self.stream_bytes // self._frame_bytes())
+        for start in range(0, total, step):
+            part = frame_indices[start:start + step]
+            keys = frame_keys[start:start + step] if frame_keys else None
+            cached = [self.cache.get_frame(k) for k in keys] if keys else [None] * len(part)
+            missing = [i for i, c in enumerate(cached) if c is None]
+            decoded = reader.read([part[i] for i in missing], process, None, max(1, step // reader.workers)) if missing else []
+            results = dict(zip(missing, decoded))
+            for i, frame_idx in enumerate(part):
+                if cached[i] is not None:
+                    signature = motion_signature(cached[i])
+                elif results.get(i) is not None:
+                    processed, signature = results[i]
+                    if keys:
+                        self.cache.put_frame(keys[i], processed)
+                else:
+                    continue
+                kept.append(frame_idx)
+                signatures.append(signature)
+            if progress_callback:
+                progress_callback(int((min(total, start + step) / total) * 100))
+        return kept, signatures
+
+    def export_decimated_spritesheet(self, path, frame_indices, fps, target=0, max_sheet=None, columns=0, progress_callback=None):
+        # Sheet of the frames that best preserve motion within the budget, durations in the metadata
+        scan_progress = (lambda v: progress_callback(v // 2)) if progress_callback else None
+        plan = self.plan_decimation(frame_indices, target, max_sheet, columns, scan_progress)
+        if not plan: return False
+        write_progress = (lambda v: progress_callback(50 + v // 2)) if progress_callback else None
+        return self.export_spritesheet(path, plan["frames"], plan["columns"], write_progress, plan["durations"], fps)
+
+    def export_variants(self, variants, frame_indices, fps, progress_callback=None):
+        # Decode, crop and key each frame once; only resize, quantize and encoding run per variant
+        if not variants: return []
+        branches = [(v.size, v.max_colors if v.max_colors is not None else self.processor.max_colors) for v in variants]
+        source_key = self.cache.source_key(self.video_loader.file_path) if self.cache and self.video_loader.file_path else None
+        if source_key and not self.cache.fits(len(set(frame_indices)) * sum(self._frame_bytes(size) for size, _ in branches)):
+            source_key = None
+        base_settings = self.processor.settings_key()
+
+        outputs = [[] for _ in variants]
+        total = len(frame_indices)
+        for i, frame_idx in enumerate(frame_indices):
+            keys = [self.cache.frame_key(source_key, frame_idx, ("variants", base_settings, tuple(branches), b))
+                    for b in range(len(branches))] if source_key else None
+            processed = [self.cache.get_frame(k) for k in keys] if keys else [None]
+            if any(p is None for p in processed):
+                raw_frame = self.video_loader.get_frame(frame_idx)
+                if raw_frame is None:
+                    continue
+                processed = self.processor.process_variants(raw_frame, branches)
+                if keys:
+                    for k, p in zip(keys, processed):
+                        self.cache.put_frame(k, p)
+            for out, p in zip(outputs, processed):
+                out.append(p)
+            if progress_callback:
+                progress_callback(int((i / total) * 100))
+
+        written = []
+        for variant, frames in zip(variants, outputs):
+            if not frames: continue
+            if variant.fmt == "spritesheet":
+                self._write_spritesheet(variant.path, frames, variant.columns)
+            elif variant.fmt == "gif":
+                self._write_gif(variant.path, frames, fps)
+            elif variant.fmt == "mp4":
+                self._write_mp4(variant.path, frames, fps)
+            elif variant.fmt == "webp":
+                self._write_webp(variant.path, frames, fps, variant.lossless, variant.quality)
+            elif variant.fmt == "apng":
+                self._write_apng(variant.path, frames, fps, variant.lossless, variant.quality)
+            else:
+                print(f"Unknown export format: {variant.fmt}")
+                continue
+            written.append(variant.path)
+        return written
+
+    def _grid_size(self, num_frames, columns):
+        cols = columns if columns > 0 else int(np.ceil(np.sqrt(num_frames)))
+        rows = int(np.ceil(num_frames / cols))
+        return cols, rows
+
+    def _export_cached_sheet(self, path, frame_count, columns, sheet_key, durations=None, fps=None):
+        # Identical frames and settings: skip decoding, PNG encoding and oxipng
+        if not self.cache.fetch_output(sheet_key, path):
+            return False
+        cols, rows = self._grid_size(frame_count, columns)
+        with Image.open(path) as img:
+            sheet_w, sheet_h = img.size
+        self._write_godot_meta(path, sheet_w // cols, sheet_h // rows, cols, rows, frame_count, durations, fps)
+        return True
+
+    def export_atlas(self, path, clips, columns=0, progress_callback=None):
+        # One PNG atlas plus a Godot 4 SpriteFrames .tres; frames shared between clips are stored once
+        clips = [c for c in clips if c.frame_indices]
+        if not clips: return False
+        total = sum(len(c.frame_indices) for c in clips)
+
+        cells = []        # unique processed frames, in atlas order
+        cell_lookup = {}  # (source, frame index) -> cell index
+        animations = []   # (clip, [cell index, ...])
+        done = 0
+        for clip in clips:
+            loader = self._clip_loader(clip)
+            if loader is None:
+                print(f"Atlas export: could not open {clip.source_path}")
+                continue
+            source = os.path.abspath(loader.file_path)
+            missing = [i for i in dict.fromkeys(clip.frame_indices) if (source, i) not in cell_lookup]
+            keys = self._frame_keys(missing, loader) or [None] * len(missing)
+            for idx, key in zip(missing, keys):
+                frame = self._processed_frame(idx, key, loader)
+                if frame is not None:
+                    cell_lookup[(source, idx)] = len(cells)
+                    cells.append(frame)
+            refs = [cell_lookup[(source, i)] for i in clip.frame_indices if (source, i) in cell_lookup]
+            if refs:
+                animations.append((clip, refs))
+            if loader is not self.video_loader:
+                loader.close()
+            done += len(clip.frame_indices)
+            if progress_callback:
+                progress_callback(int((done / total) * 100))
+        if not cells: return False
+
+        atlas, regions = self._pack_atlas(cells, columns)
+        Image.fromarray(atlas).save(path, optimize=True, compress_level=9)
+        try:
+            oxipng.optimize(path)
+        except Exception as e:
+            print(f"oxipng optimization failed: {e}")
+
+        self._write_godot_spriteframes(path, regions, animations)
         return True
 
-    def _write_godot_meta(self, sheet_path, f_w, f_h, cols, rows, count):
+    def _clip_loader(self, clip):
+        if not clip.source_path or (self.video_loader.file_path and
+                os.path.abspath(clip.source_path) == os.path.abspath(self.video_loader.file_path)):
+            return self.video_loader
+        loader = VideoLoader()
+        if not loader.open_file(clip.source_path):
+            loader.close()
+            return None
+        return loader
+
+    def _pack_atlas(self, frames, columns=0):
+        # Shelf packing in frame order; with matching frame sizes this is a plain grid
+        max_w = max(f.shape[1] for f in frames)
+        if columns > 0:
+            atlas_w = columns * max_w
+        else:
+            area = sum(f.shape[0] * f.shape[1] for f in frames)
+            atlas_w = max(max_w, int(np.ceil(np.sqrt(area) / max_w)) * max_w)
+
+        regions = []
+        x = y = shelf_h = 0
+        for f in frames:
+            f_h, f_w = f.shape[:2]
+            if x + f_w > atlas_w:
+                x, y, shelf_h = 0, y + shelf_h, 0
+            regions.append((x, y, f_w, f_h))
+            x += f_w
+            shelf_h = max(shelf_h, f_h)
+        atlas_h = y + shelf_h
+
+        atlas = np.zeros((atlas_h, atlas_w, 4), dtype=np.uint8)
+        for f, (x, y, f_w, f_h) in zip(frames, regions):
+            if f.shape[2] == 3:
+                f = cv2.cvtColor(f, cv2.COLOR_RGB2RGBA)
+            atlas[y:y+f_h, x:x+f_w] = f
+        return atlas, regions
+
+    def _write_godot_spriteframes(self, atlas_path, regions, animations):
+        tres_path = str(Path(atlas_path).with_suffix('.tres'))
+        used = sorted({r for _, refs in animations for r in refs})
+        sub_ids = {cell: f"AtlasTexture_{n}" for n, cell in enumerate(used, 1)}
+        lines = [
+            f'[gd_resource type="SpriteFrames" load_steps={len(used) + 2} format=3]',
+            "",
+            # Relative paths resolve against the .tres location, so keep both files together
+            f'[ext_resource type="Texture2D" path="{os.path.basename(atlas_path)}" id="1_atlas"]',
+            "",
+        ]
+        for cell in used:
+            x, y, w, h = regions[cell]
+            lines += [
+                f'[sub_resource type="AtlasTexture" id="{sub_ids[cell]}"]',
+                'atlas = ExtResource("1_atlas")',
+                f"region = Rect2({x}, {y}, {w}, {h})",
+                "",
+            ]
+        anim_blocks = []
+        for clip, refs in animations:
+            frames = ", ".join(
+                '{\n"duration": 1.0,\n"texture": SubResource("%s")\n}' % sub_ids[r] for r in refs
+            )
+            anim_blocks.append(
+                '{\n"frames": [%s],\n"loop": %s,\n"name": &"%s",\n"speed": %s\n}'
+                % (frames, "true" if clip.loop else "false", _godot_escape(clip.name), float(clip.fps))
+            )
+        lines += ["[resource]", "animations = [%s]" % ", ".join(anim_blocks), ""]
+        with open(tres_path, 'w') as f:
+            f.write("\n".join(lines))
+
+    def _write_godot_meta(self, sheet_path, f_w, f_h, cols, rows, count, durations=None, fps=None):
         meta_path = str(Path(sheet_path).with_suffix('.txt'))
         with open(meta_path, 'w') as f:
             f.write("--- SpriteSpite Export Metadata ---\n")
             f.write(f"Sprite Sheet: {os.path.basename(sheet_path)}\n")
             f.write(f"Frame Size: {f_w}x{f_h}\n")
             f.write(f"Grid: {cols} columns, {rows} rows\n")
-            f.write(f"Total Frames: {count}\n\n")
+            f.write(f"Total Frames: {count}\n")
+            if durations:
+                f.write(f"Frame Durations: {', '.join(map(str, durations))}\n")
+                f.write(f"(each value is in source frames{f' at {fps:g} FPS' if fps else ''}; together they cover {sum(durations)} source frames)\n")
+            f.write("\n")
             f.write("--- Godot 4 Import Instructions ---\n")
             f.write("1. In Godot, add an 'AnimatedSprite2D' node to your scene.\n")
             f.write("2. In the Inspector, click 'Sprite Frames' -> 'New SpriteFrames'.\n")
@@ -121,3 +539,5 @@ class SpriteExporter:
             f.write(f"6. Set Horizontal to {cols} and Vertical to {rows}.\n")
             f.write(f"7. Select the frames (usually all {count}) and click 'Add Frames'.\n")
             f.write("8. Set 'Animation Speed' to match your source FPS.\n")
+            if durations:
+                f.write("9. Set each frame's 'Frame Duration' to the matching value in 'Frame Durations' above.\n")
@@ -0,0 +1,73 @@
+"""Opens media files off the GUI thread."""
+
+import itertools
+import threading
+
+import cv2
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from app.video_io import read_capture_info
+
+
+class AsyncFileOpener(QObject):
+    """Opens a file on a worker thread and reports progress through signals.
+
+    Every request gets a token. Starting a new request cancels the previous one,
+    and a cancelled or superseded worker releases its own VideoCapture, so only
+    the latest file ever reaches the GUI. Signals are queued onto the GUI thread.
+    """
+    metadata_ready = pyqtSignal(int, str, object)          # token, path, info
+    opened = pyqtSignal(int, str, object, object, object)  # token, path, capture, info, RGB frame 0 or None
+    failed = pyqtSignal(int, str)                          # token, path
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tokens = itertools.count(1)
+        self._current = 0
+        self._cancel = None
+        self._lock = threading.Lock()
+
+    def open(self, file_path) -> int:
+        with self._lock:
+            if self._cancel:
+                self._cancel.set()
+            token = next(self._tokens)
+            self._current = token
+            self._cancel = cancel = threading.Event()
+        threading.Thread(target=self._work, args=(token, file_path, cancel),
+                         name="spritespite-open", daemon=True).start()
+        return token
+
+    def cancel(self):
+        with self._lock:
+            if self._cancel:
+                self._cancel.set()
+            self._current = 0
+
+    def is_current(self, token) -> bool:
+        with self._lock:
+            return token == self._current
+
+    def _work(self, token, file_path, cancel):
+        cap = cv2.VideoCapture(file_path)
+        if cancel.is_set() or not cap.isOpened():
+            cap.release()
+            if not cancel.is_set():
+                self.failed.emit(token, file_path)
+            return
+        info = read_capture_info(cap)
+        self.metadata_ready.emit(token, file_path, info)
+
+        first_frame = None
+        if not cancel.is_set():
+            ret, frame = cap.read()
+            if ret:
+                first_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            else:
+                # Leave the capture at its start so the loader can seek normally
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        if cancel.is_set():
+            cap.release()
+            return
+        # The receiver owns the capture from here and must release it if the token is stale
+        self.opened.emit(token, file_path, cap, info, first_frame)
@@ -0,0 +1,439 @@
+"""Local job server for queued exports.
+
+Runs a small JSON-over-HTTP service bound to localhost so build scripts and
+engine tooling can submit exports without launching the GUI:
+
+    POST /jobs          submit a job (Content-Type: application/json), returns {"id": ...}
+    GET  /jobs          list all jobs
+    GET  /jobs/<id>     status, progress and timings of one job
+
+A job body looks like:
+
+    {
+        "source": "/path/to/clip.mp4",
+        "output": "/path/to/sheet.png",
+        "format": "spritesheet",        # spritesheet | atlas | gif | webp | apng | mp4
+        "lossless": true,               # webp/apng; false enables "quality" (1-100)
+        "frames": [0, 2, 4],            # or {"start": 0, "end": 47}, default: all
+        "columns": 0,
+        "fps": 12,                      # default: source FPS
+        "crop": [left, top, right, bottom],
+        "chroma": {"color": [0, 255, 0], "tolerance": 30, "edge_trim": 0, "feather": 0},
+        "resize": [64, 64],
+        "max_colors": 256,
+        "decimate": {"frames": 24, "max_sheet": [2048, 2048]}   # spritesheet only, either key optional
+    }
+
+Atlas jobs take a list of animations instead of "frames"; each entry may
+point at its own source (defaulting to the job's source):
+
+    "animations": [
+        {"name": "idle", "frames": {"start": 0, "end": 11}, "fps": 12},
+        {"name": "jump", "frames": [0, 3, 6], "fps": 24, "source": "/path/to/jump.mp4"}
+    ]
+
+Any job may instead list "variants" to write several sizes and formats from a
+single decode pass ("output" and "format" are then ignored):
+
+    "variants": [
+        {"output": "/out/hero_32.png", "format": "spritesheet", "size": [32, 32]},
+        {"output": "/out/hero_64.gif", "format": "gif", "size": [64, 64], "max_colors": 64}
+    ]
+"""
+
+import argparse
+import ipaddress
+import itertools
+import json
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.video_io import VideoLoader, ParallelFrameReader
+from app.processing import ImageProcessor
+from app.exporters import SpriteExporter, AtlasClip, ExportVariant
+from app.export_cache import ExportCache
+
+FORMATS = ("spritesheet", "atlas", "gif", "webp", "apng", "mp4")
+VARIANT_FORMATS = ("spritesheet", "gif", "webp", "apng", "mp4")
+
+
+class JobError(ValueError):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.status = "queued"
+        self.progress = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "source": self.spec["source"],
+            "output": self.spec["output"],
+            "format": self.spec["format"],
+            "queued_seconds": round((self.started_at or now) - self.submitted_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+def validate_spec(spec):
+    if not isinstance(spec, dict):
+        raise JobError("job must be a JSON object")
+    variants = spec.get("variants")
+    if variants is not None:
+        if not isinstance(variants, list) or not variants:
+            raise JobError("'variants' must be a non-empty list")
+        for v in variants:
+            if not isinstance(v, dict) or not v.get("output"):
+                raise JobError("each variant needs an 'output'")
+            if v.get("format", "spritesheet") not in VARIANT_FORMATS:
+                raise JobError(f"variant 'format' must be one of {', '.join(VARIANT_FORMATS)}")
+        spec.setdefault("output", variants[0]["output"])
+    for field in ("source", "output"):
+        if not isinstance(spec.get(field), str) or not spec[field]:
+            raise JobError(f"'{field}' is required")
+    if not os.path.isfile(spec["source"]):
+        raise JobError(f"source not found: {spec['source']}")
+    spec.setdefault("format", "spritesheet")
+    if spec["format"] not in FORMATS:
+        raise JobError(f"'format' must be one of {', '.join(FORMATS)}")
+    budget = spec.get("decimate")
+    if budget is not None and (not isinstance(budget, dict) or not (budget.get("frames") or budget.get("max_sheet"))):
+        raise JobError("'decimate' needs 'frames' and/or 'max_sheet'")
+    if budget is not None and variants is not None:
+        raise JobError("'decimate' can't be combined with 'variants'")
+    if spec["format"] == "atlas":
+        animations = spec.get("animations")
+        if not isinstance(animations, list) or not animations:
+            raise JobError("'animations' is required for atlas jobs")
+        for anim in animations:
+            if not isinstance(anim, dict) or not anim.get("name"):
+                raise JobError("each animation needs a 'name'")
+            if anim.get("source") and not os.path.isfile(anim["source"]):
+                raise JobError(f"source not found: {anim['source']}")
+    return spec
+
+
+def apply_settings(processor, spec):
+    """Mirror the GUI controls onto an ImageProcessor."""
+    crop = spec.get("crop")
+    if crop:
+        processor.set_crop_margins(*(int(v) for v in crop))
+    chroma = spec.get("chroma")
+    if chroma:
+        color = tuple(int(c) for c in chroma.get("color", (0, 255, 0)))
+        processor.set_chroma_settings(True, color, int(chroma.get("tolerance", 30)),
+                                      float(chroma.get("edge_trim", 0)), float(chroma.get("feather", 0)))
+    resize = spec.get("resize")
+    if resize:
+        processor.set_resize(True, int(resize[0]), int(resize[1]))
+    if "max_colors" in spec:
+        processor.set_compression(int(spec["max_colors"]))
+
+
+def resolve_clips(spec, loader, default_fps):
+    clips = []
+    for anim in spec["animations"]:
+        source = anim.get("source") or spec["source"]
+        if os.path.abspath(source) == os.path.abspath(loader.file_path):
+            frame_count = loader.frame_count
+        else:
+            probe = VideoLoader()
+            frame_count = probe.frame_count if probe.open_file(source) else 0
+            probe.close()
+        frames = resolve_frames(anim, frame_count)
+        clips.append(AtlasClip(anim["name"], frames, float(anim.get("fps") or default_fps), source, bool(anim.get("loop", True))))
+    return clips
+
+
+def resolve_frames(spec, frame_count):
+    frames = spec.get("frames")
+    if frames is None:
+        return list(range(frame_count))
+    if isinstance(frames, dict):
+        start = max(0, int(frames.get("start", 0)))
+        end = min(frame_count - 1, int(frames.get("end", frame_count - 1)))
+        return list(range(start, end + 1))
+    return [int(i) for i in frames if 0 <= int(i) < frame_count]
+
+
+class DecoderPool:
+    """Keeps opened VideoLoaders warm between jobs, one per concurrent user, plus one parallel reader per source."""
+
+    def __init__(self, max_idle=8, reader_workers=1):
+        self.max_idle = max_idle
+        self.reader_workers = reader_workers
+        self._idle = []  # (path, loader), most recently returned last
+        self._readers = {}  # path -> ParallelFrameReader, shared by every job on that source
+        self._lock = threading.Lock()
+
+    def acquire(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == path:
+                    return self._idle.pop(i)[1]
+        loader = VideoLoader()
+        if not loader.open_file(path):
+            loader.close()
+            raise JobError(f"could not open source: {path}")
+        return loader
+
+    def release(self, loader):
+        with self._lock:
+            self._idle.append((os.path.abspath(loader.file_path), loader))
+            while len(self._idle) > self.max_idle:
+                self._idle.pop(0)[1].close()
+
+    def reader(self, path):
+        if self.reader_workers < 2:
+            return None
+        path = os.path.abspath(path)
+        with self._lock:
+            reader = self._readers.pop(path, None) or ParallelFrameReader(path, self.reader_workers)
+            self._readers[path] = reader  # reinsert as most recently used
+            while len(self._readers) > self.max_idle:
+                self._readers.pop(next(iter(self._readers))).close()
+            return reader
+
+    def close(self):
+        with self._lock:
+            for _, loader in self._idle:
+                loader.close()
+            self._idle.clear()
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+
+class JobServer:
+    def __init__(self, workers=2, cache=None, max_queued=64, keep_finished=256, finished_ttl=3600):
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.finished_ttl = finished_ttl
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Split the cores between concurrent jobs rather than giving each job all of them
+        self.decoders = DecoderPool(max_idle=workers * 2, reader_workers=max(1, (os.cpu_count() or 1) // workers))
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spritespite-job")
+
+    def submit(self, spec):
+        spec = validate_spec(spec)
+        with self._lock:
+            self._prune()
+            if sum(j.status == "queued" for j in self.jobs.values()) >= self.max_queued:
+                raise QueueFull(f"queue is full ({self.max_queued} jobs waiting)")
+            job = Job(str(next(self._ids)), spec)
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._prune()
+            return list(self.jobs.values())
+
+    def _prune(self):
+        # Drop finished jobs past the TTL, then the oldest beyond keep_finished
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        finished.sort(key=lambda j: j.finished_at)
+        cutoff = time.time() - self.finished_ttl
+        excess = len(finished) - self.keep_finished
+        for i, job in enumerate(finished):
+            if i < excess or job.finished_at < cutoff:
+                del self.jobs[job.id]
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        loader = exporter = None
+        try:
+            loader = self.decoders.acquire(job.spec["source"])
+            processor = ImageProcessor()
+            apply_settings(processor, job.spec)
+            exporter = SpriteExporter(loader, processor, self.cache, self.decoders.reader(loader.file_path))
+            exporter.parallel_workers = self.decoders.reader_workers
+            frames = resolve_frames(job.spec, loader.frame_count)
+
+            def on_progress(v):
+                job.progress = v
+
+            fmt, out = job.spec["format"], job.spec["output"]
+            fps = float(job.spec.get("fps") or loader.fps)
+            lossless, quality = bool(job.spec.get("lossless", True)), int(job.spec.get("quality", 80))
+            if job.spec.get("variants"):
+                variants = [
+                    ExportVariant(v["output"], v.get("format", "spritesheet"), v.get("size"),
+                                  int(v.get("columns", job.spec.get("columns", 0))), v.get("max_colors"),
+                                  bool(v.get("lossless", lossless)), int(v.get("quality", quality)))
+                    for v in job.spec["variants"]
+                ]
+                ok = bool(exporter.export_variants(variants, frames, fps, on_progress))
+            elif fmt == "spritesheet" and job.spec.get("decimate"):
+                budget = job.spec["decimate"]
+                max_sheet = tuple(int(v) for v in budget["max_sheet"]) if budget.get("max_sheet") else None
+                ok = exporter.export_decimated_spritesheet(out, frames, fps, int(budget.get("frames", 0)), max_sheet,
+                                                           int(job.spec.get("columns", 0)), on_progress)
+            elif fmt == "spritesheet":
+                ok = exporter.export_spritesheet(out, frames, int(job.spec.get("columns", 0)), on_progress)
+            elif fmt == "atlas":
+                clips = resolve_clips(job.spec, loader, fps)
+                ok = exporter.export_atlas(out, clips, int(job.spec.get("columns", 0)), on_progress)
+            elif fmt == "gif":
+                ok = exporter.export_gif(out, frames, fps, on_progress)
+            elif fmt == "webp":
+                ok = exporter.export_webp(out, frames, fps, lossless, quality, on_progress)
+            elif fmt == "apng":
+                ok = exporter.export_apng(out, frames, fps, lossless, quality, on_progress)
+            else:
+                ok = exporter.export_mp4(out, frames, fps, on_progress)
+            if not ok:
+                raise JobError("no frames could be exported")
+            job.progress = 100
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            if exporter is not None:
+                exporter.close()
+            if loader is not None and loader.cap is not None:
+                self.decoders.release(loader)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.decoders.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SpriteSpiteJobServer/0.1"
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _forbidden(self):
+        # Loopback binding alone doesn't stop a web page in the user's browser from
+        # reaching us (CSRF, DNS rebinding), so only accept plain local clients
+        if "Origin" in self.headers:
+            return "cross-origin requests are not allowed"
+        host, port = self.server.server_address[:2]
+        names = {"localhost", "127.0.0.1", "[::1]", f"[{host}]" if ":" in host else host}
+        allowed = {f"{n}:{port}" for n in names} | (names if port == 80 else set())
+        if self.headers.get("Host", "").lower() not in allowed:
+            return "invalid Host header"
+        return None
+
+    def do_GET(self):
+        error = self._forbidden()
+        if error:
+            return self._send(403, {"error": error})
+        jobs = self.server.jobs
+        if self.path.rstrip("/") == "/jobs":
+            return self._send(200, [j.to_dict() for j in jobs.list()])
+        m = re.fullmatch(r"/jobs/([^/]+)/?", self.path)
+        job = jobs.get(m.group(1)) if m else None
+        if job is None:
+            return self._send(404, {"error": "not found"})
+        self._send(200, job.to_dict())
+
+    def do_POST(self):
+        error = self._forbidden()
+        if error:
+            return self._send(403, {"error": error})
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "not found"})
+        # Browsers can send text/plain or form bodies cross-site without a preflight
+        if self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            return self._send(415, {"error": "Content-Type must be application/json"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = json.loads(self.rfile.read(length) or b"null")
+            job = self.server.jobs.submit(spec)
+        except (ValueError, JobError) as e:
+            return self._send(400, {"error": str(e)})
+        except QueueFull as e:
+            return self._send(503, {"error": str(e)})
+        self._send(202, {"id": job.id})
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class _IPv6Server(ThreadingHTTPServer):
+    address_family = socket.AF_INET6
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(host="127.0.0.1", port=8765, workers=2, cache=None, max_queued=64):
+    # Jobs read and write arbitrary local paths, so never expose the server beyond this machine
+    if not is_loopback(host):
+        raise ValueError(f"refusing to listen on non-loopback address {host!r}")
+    jobs = JobServer(workers=workers, cache=cache, max_queued=max_queued)
+    server_cls = _IPv6Server if ":" in host else ThreadingHTTPServer
+    httpd = server_cls((host, port), _Handler)
+    httpd.jobs = jobs
+    print(f"SpriteSpite job server listening on http://{host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        jobs.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SpriteSpite local export job server")
+    parser.add_argument("--host", default="127.0.0.1", help="loopback address to bind (e.g. 127.0.0.1 or ::1)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument("--max-queued", type=int, default=64, help="reject new jobs with 503 beyond this many waiting")
+    parser.add_argument("--no-cache", action="store_true", help="disable the disk-backed export cache")
+    args = parser.parse_args()
+    if not is_loopback(args.host):
+        parser.error(f"--host must be a loopback address, got {args.host!r}")
+    serve(args.host, args.port, args.workers, None if args.no_cache else ExportCache(), args.max_queued)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Loop point detection from compact per-frame signatures."""
+
+import cv2
+import numpy as np
+
+from app.video_io import ParallelFrameReader
+
+
+def frame_signature(rgb: np.ndarray, size=16) -> np.ndarray:
+    # Shrink first so the colour conversion only touches size x size pixels
+    small = cv2.resize(rgb, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).ravel()
+
+
+def frame_signatures(file_path, start=0, end=None, size=16, workers=1, progress_callback=None) -> np.ndarray:
+    """Decode frames start..end once into an (N, size*size) uint8 array of tiny grayscale thumbnails.
+
+    With workers > 1 the range is split across several captures (see
+    ParallelFrameReader); otherwise it's one sequential read. Stops at the
+    first frame that fails to decode, so row k is always frame start + k.
+    """
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        cap.release()
+        return np.zeros((0, size * size), np.uint8)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    end = total - 1 if end is None else min(end, total - 1)
+    count = max(0, end - start + 1)
+
+    if workers > 1:
+        cap.release()
+        reader = ParallelFrameReader(file_path, workers)
+        try:
+            sigs = reader.read(range(start, end + 1), lambda f: frame_signature(f, size), progress_callback)
+        finally:
+            reader.close()
+        n = next((k for k, s in enumerate(sigs) if s is None), len(sigs))
+        return np.array(sigs[:n], np.uint8).reshape(n, size * size)
+
+    out = np.empty((count, size * size), np.uint8)
+    n = 0
+    try:
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        while n < count:
+            ret, frame = cap.read()
+            if not ret: break
+            small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+            out[n] = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).ravel()
+            n += 1
+            if progress_callback and n % 256 == 0:
+                progress_callback(int(n / count * 100))
+    finally:
+        cap.release()
+    return out[:n]
+
+
+def find_loops(signatures, min_length, max_length, count=5, first_frame=0, block_cells=1 << 22):
+    """Suggest seamless loops as a list of {"start", "end", "score"} dicts, best first.
+
+    A loop plays start..end and jumps back to start, so it's seamless when frame
+    end + 1 looks like frame start. The score is the RMS difference across that
+    jump divided by the mean frame-to-frame difference inside the loop: below
+    1.0 the jump is smaller than an ordinary step. Dividing by in-loop motion
+    also keeps still stretches, which match anything, from crowding out real
+    loops. Lengths count frames in the loop (end - start + 1).
+
+    Distances come from |a|^2 + |b|^2 - 2ab with one matrix product per block
+    of starts, only against ends within the length range, so the work is
+    O(N * (max_length - min_length)) rather than O(N^2).
+    """
+    sigs = np.asarray(signatures, np.float32)
+    n, dims = sigs.shape if sigs.ndim == 2 else (0, 0)
+    min_length, max_length = max(1, int(min_length)), int(max_length)
+    if n < min_length + 1 or max_length < min_length:
+        return []
+    sigs = (sigs - sigs.mean(axis=0)) / 255.0  # centring keeps the expansion precise in float32
+    sq = np.einsum("ij,ij->i", sigs, sigs)
+    steps = np.sqrt(np.mean(np.diff(sigs, axis=0) ** 2, axis=1))
+    motion = np.concatenate([[0.0], np.cumsum(steps, dtype=np.float64)]).astype(np.float32)
+    eps = 1e-3
+
+    span = max_length - min_length + 1
+    rows = int(max(1, min(1024, block_cells // (span + 1024))))
+    best_score = np.full(n, np.inf, np.float32)
+    best_match = np.zeros(n, np.int64)
+    for i0 in range(0, n - min_length, rows):
+        i1 = min(i0 + rows, n - min_length)
+        # Frame j = end + 1 is compared against frame i = start
+        j0, j1 = i0 + min_length, min(n, i1 - 1 + max_length + 1)
+        gram = sigs[i0:i1] @ sigs[j0:j1].T
+        dist = sq[i0:i1, None] + sq[None, j0:j1] - 2 * gram
+        np.maximum(dist, 0, out=dist)
+        lag = np.arange(j0, j1)[None, :] - np.arange(i0, i1)[:, None]
+        valid = (lag >= min_length) & (lag <= max_length)
+        # Mean step between consecutive frames of start..end
+        inside = (motion[None, j0 - 1:j1 - 1] - motion[i0:i1, None]) / np.maximum(lag - 1, 1)
+        score = np.sqrt(dist / dims) / (inside + eps)
+        score[~valid] = np.inf
+        cols = np.argmin(score, axis=1)
+        best_match[i0:i1] = j0 + cols
+        best_score[i0:i1] = score[np.arange(i1 - i0), cols]
+
+    # Greedy pick, skipping loops that start and end near an already chosen one
+    separation = max(2, min_length // 2)
+    picked = []
+    for i in np.argsort(best_score, kind="stable"):
+        if not np.isfinite(best_score[i]) or len(picked) >= count:
+            break
+        start, end = int(i), int(best_match[i]) - 1
+        if any(abs(start - s) < separation and abs(end - e) < separation for s, e, _ in picked):
+            continue
+        picked.append((start, end, float(best_score[i])))
+    return [{"start": s + first_frame, "end": e + first_frame, "score": round(sc, 4)} for s, e, sc in picked]
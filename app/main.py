@@ -1,23 +1,147 @@
+import time
+_T0 = time.perf_counter()
+
+import copy
+import importlib
+import os
 import sys
+import threading
 from PyQt6.QtWidgets import QApplication, QFileDialog
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import Qt, QTimer, QObject, QEvent, pyqtSignal
 from app.ui import MainWindow
-from app.video_io import VideoLoader
-from app.processing import ImageProcessor
-from app.exporters import SpriteExporter
+from app.playback import PlaybackClock
+
+# Codec, image-processing and export modules (cv2, numpy, PIL, oxipng) are the
+# bulk of startup time. They're imported after the window first paints, either
+# by the background warm-up thread or on first use, whichever comes first.
+EXPORT_EXTENSIONS = {"atlas": ".png", "spritesheet": ".png", "webp": ".webp", "apng": ".png", "gif": ".gif", "mp4": ".mp4"}
+BACKEND_MODULES = ("numpy", "cv2", "PIL.Image", "oxipng", "app.video_io", "app.processing", "app.apng", "app.exporters", "app.export_cache", "app.loop_finder")
+
+
+class StartupTimer(QObject):
+    """Records time-to-first-paint and backend readiness for --startup-report."""
+    first_painted = pyqtSignal()
+    backend_loaded = pyqtSignal()
+
+    def __init__(self, t0):
+        super().__init__()
+        self.t0 = t0
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks.setdefault(name, (time.perf_counter() - self.t0) * 1000)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint and "first_paint" not in self.marks:
+            self.mark("first_paint")
+            obj.removeEventFilter(self)
+            self.first_painted.emit()
+        return False
+
+    def report(self):
+        lines = ["--- SpriteSpite Startup Report ---"]
+        for name, ms in sorted(self.marks.items(), key=lambda kv: kv[1]):
+            lines.append(f"{name:>16}: {ms:8.1f} ms")
+        return "\n".join(lines)
+
+
+class LoopSearch(QObject):
+    """Finds loop candidates on a worker thread, keeping the last file's signatures for re-runs."""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str, object)  # path, list of loop candidates
+
+    def __init__(self):
+        super().__init__()
+        self.running = False
+        self._signatures = (None, None)
+
+    def start(self, file_path, min_length, max_length, workers=1) -> bool:
+        if self.running: return False
+        self.running = True
+        threading.Thread(target=self._work, args=(file_path, min_length, max_length, workers),
+                         name="spritespite-loops", daemon=True).start()
+        return True
+
+    def _work(self, file_path, min_length, max_length, workers):
+        from app.loop_finder import frame_signatures, find_loops
+        loops = []
+        try:
+            path, sigs = self._signatures
+            if path != file_path:
+                sigs = frame_signatures(file_path, workers=workers, progress_callback=self.progress.emit)
+                self._signatures = (file_path, sigs)
+            loops = find_loops(sigs, min_length, max_length)
+        except Exception as e:
+            print(f"Loop search failed: {e}")
+        finally:
+            self.running = False
+        self.finished.emit(file_path, loops)
+
+
+class AutoCropScan(QObject):
+    """Unions the keyed subject's bounds over a frame selection on a worker thread."""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str, object, int)  # path, (x1, y1, x2, y2) or None, padding
+
+    def __init__(self):
+        super().__init__()
+        self.running = False
+        self._cancel = threading.Event()
+
+    def start(self, file_path, frame_indices, processor, padding, workers=1) -> bool:
+        if self.running: return False
+        self.running = True
+        self._cancel = threading.Event()
+        threading.Thread(target=self._work, args=(file_path, frame_indices, processor, padding, workers, self._cancel),
+                         name="spritespite-autocrop", daemon=True).start()
+        return True
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _work(self, file_path, frame_indices, processor, padding, workers, cancel):
+        from app.video_io import ParallelFrameReader
+        # Workers return one box per frame, so memory stays flat however large the selection
+        reader = ParallelFrameReader(file_path, workers)
+        bounds = None
+        step = max(64, workers * 16)
+        try:
+            for start in range(0, len(frame_indices), step):
+                if cancel.is_set(): break
+                boxes = reader.read(frame_indices[start:start + step], processor.frame_bounds, None, max(1, step // workers))
+                bounds = processor.union_bounds([bounds] + boxes)
+                self.progress.emit(int(min(len(frame_indices), start + step) / len(frame_indices) * 100))
+        except Exception as e:
+            print(f"Auto crop failed: {e}")
+            bounds = None
+        finally:
+            reader.close()
+            self.running = False
+        self.finished.emit(file_path, None if cancel.is_set() else bounds, padding)
+
 
 class SpriteSpiteApp:
     def __init__(self):
-        self.video_loader = VideoLoader()
-        self.processor = ImageProcessor()
-        self.exporter = SpriteExporter(self.video_loader, self.processor)
+        self._video_loader = None
+        self._processor = None
+        self._exporter = None
+        self._backend_lock = threading.Lock()
+        self._file_opener = None
+        self.loop_search = LoopSearch()
+        self.loop_search.progress.connect(lambda v: self.ui.set_progress(max(1, v)))
+        self.loop_search.finished.connect(self.on_loops_found)
+        self.auto_crop_scan = AutoCropScan()
+        self.auto_crop_scan.progress.connect(lambda v: self.ui.set_progress(max(1, v)))
+        self.auto_crop_scan.finished.connect(self.on_auto_crop_done)
         self.ui = MainWindow(self.handle_open_file)
         
         self.current_frame_index = 0
         self.start_frame = 0
         self.end_frame = 0
         
+        self.playback_clock = PlaybackClock()
         self.playback_timer = QTimer()
+        self.playback_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.playback_timer.timeout.connect(self.next_frame)
         
         self.scrub_timer = QTimer()
@@ -34,8 +158,47 @@ class SpriteSpiteApp:
         self.ui.export_requested.connect(self.handle_export)
         self.ui.add_current_frame_requested.connect(self.add_current_frame_to_list)
         self.ui.multi_select_requested.connect(self.open_multi_frame_dialog)
+        self.ui.auto_crop_requested.connect(self.handle_auto_crop)
+        self.ui.loop_search_requested.connect(self.handle_loop_search)
         self.ui.play_button.toggled.connect(self.toggle_playback)
 
+    def warm_up_backend(self, on_done=None):
+        # Import heavy modules off the GUI thread; first use on the GUI thread simply waits on the import lock
+        def work():
+            for name in BACKEND_MODULES:
+                try:
+                    importlib.import_module(name)
+                except ImportError as e:
+                    print(f"Backend warm-up failed for {name}: {e}")
+            if on_done: on_done()
+        threading.Thread(target=work, name="spritespite-warmup", daemon=True).start()
+
+    def _load_backend(self):
+        with self._backend_lock:
+            if self._exporter is None:
+                from app.video_io import VideoLoader
+                from app.processing import ImageProcessor
+                from app.exporters import SpriteExporter
+                from app.export_cache import ExportCache
+                self._video_loader = VideoLoader()
+                self._processor = ImageProcessor()
+                self._exporter = SpriteExporter(self._video_loader, self._processor, ExportCache())
+
+    @property
+    def video_loader(self):
+        if self._video_loader is None: self._load_backend()
+        return self._video_loader
+
+    @property
+    def processor(self):
+        if self._processor is None: self._load_backend()
+        return self._processor
+
+    @property
+    def exporter(self):
+        if self._exporter is None: self._load_backend()
+        return self._exporter
+
     def open_multi_frame_dialog(self):
         from app.ui import MultiFrameDialog
         dialog = MultiFrameDialog(self.ui, self.video_loader)
@@ -73,15 +236,88 @@ class SpriteSpiteApp:
             except ValueError: continue
         return indices
 
-    def handle_export(self, fmt_str, cols):
+    def _parse_size_list(self, text):
+        # "32, 64, 128x96" -> [(32, 32), (64, 64), (128, 96)]
+        sizes = []
+        for part in text.replace(' ', '').lower().split(','):
+            if not part: continue
+            try:
+                w, _, h = part.partition('x')
+                size = (int(w), int(h or w))
+            except ValueError: continue
+            if size[0] > 0 and size[1] > 0 and size not in sizes: sizes.append(size)
+        return sizes
+
+    def _atlas_clip(self, name, indices, fps):
+        from app.exporters import AtlasClip
+        return AtlasClip(name, indices, fps)
+
+    def _parse_animation_list(self, text, max_frames, default_fps):
+        # "idle: 0-11 @12; run: 12-23 @24" -> [AtlasClip, ...]
+        clips = []
+        for n, entry in enumerate(text.split(';')):
+            if not entry.strip(): continue
+            name, _, rest = entry.rpartition(':')
+            name = name.strip() or f"anim_{n}"
+            frames_str, _, fps_str = rest.partition('@')
+            try:
+                fps = float(fps_str) if fps_str.strip() else default_fps
+            except ValueError:
+                fps = default_fps
+            indices = self._parse_frame_selection(frames_str, max_frames)
+            if indices: clips.append(self._atlas_clip(name, indices, fps))
+        return clips
+
+    def _selected_frame_indices(self):
         if self.ui.individual_radio.isChecked():
             selection = self.ui.frames_input.text()
-            frame_indices = self._parse_frame_selection(selection, self.video_loader.frame_count)
-            if not frame_indices: return
-        else:
-            frame_indices = list(range(self.ui.start_frame_spin.value(), self.ui.end_frame_spin.value() + 1))
+            return self._parse_frame_selection(selection, self.video_loader.frame_count)
+        return list(range(self.ui.start_frame_spin.value(), self.ui.end_frame_spin.value() + 1))
+
+    def handle_auto_crop(self, padding):
+        # A second click while scanning cancels
+        if self.auto_crop_scan.running:
+            self.auto_crop_scan.cancel()
+            return
+        frame_indices = sorted(set(self._selected_frame_indices()))
+        path = self.video_loader.file_path
+        if not frame_indices or not path or not self.processor.use_chroma: return
+        # Scan with a snapshot so settings changed mid-scan don't mix
+        if not self.auto_crop_scan.start(path, frame_indices, copy.copy(self.processor), padding, self.exporter.parallel_workers): return
+        self.ui.auto_crop_button.setText("Cancel")
+        self.ui.set_progress(1)
+
+    def on_auto_crop_done(self, file_path, bounds, padding):
+        self.ui.auto_crop_button.setText("Auto")
+        self.ui.set_progress(100)
+        if bounds is None or file_path != self.video_loader.file_path: return
+        self.ui.set_crop_margins(*self.processor.crop_margins(bounds, self.video_loader.width, self.video_loader.height, padding))
+
+    def handle_loop_search(self, min_length, max_length):
+        path = self.video_loader.file_path
+        if not path or not self.loop_search.start(path, min_length, max_length, self.exporter.parallel_workers): return
+        self.ui.find_loop_button.setEnabled(False)
+        self.ui.set_progress(1)
+
+    def on_loops_found(self, file_path, loops):
+        self.ui.find_loop_button.setEnabled(True)
+        self.ui.set_progress(100)
+        if file_path == self.video_loader.file_path:
+            self.ui.set_loop_candidates(loops)
 
-        ext = ".png" if "Sprite" in fmt_str else (".gif" if "GIF" in fmt_str else ".mp4")
+    def _export_format(self, fmt_str):
+        for token, fmt in (("Atlas", "atlas"), ("Sprite", "spritesheet"), ("WebP", "webp"), ("APNG", "apng"), ("GIF", "gif")):
+            if token in fmt_str: return fmt
+        return "mp4"
+
+    def handle_export(self, fmt_str, cols):
+        # Nothing is attached while a newly opened file is still loading
+        if not self.video_loader.file_path: return
+        frame_indices = self._selected_frame_indices()
+        if not frame_indices: return
+
+        fmt = self._export_format(fmt_str)
+        ext = EXPORT_EXTENSIONS[fmt]
         path, _ = QFileDialog.getSaveFileName(self.ui, "Export File", "output" + ext, f"File (*{ext})")
         if not path: return
         
@@ -89,32 +325,82 @@ class SpriteSpiteApp:
         self.ui.set_progress(1)
         success = False
         fps = self.video_loader.fps
+        lossless, quality = self.ui.lossless_check.isChecked(), self.ui.quality_spin.value()
         
-        if "Sprite" in fmt_str:
-            success = self.exporter.export_spritesheet(path, frame_indices, cols, self.ui.set_progress)
-        elif "GIF" in fmt_str:
+        sizes = self._parse_size_list(self.ui.sizes_input.text())
+        from app.exporters import AtlasClip, ExportVariant
+        if sizes and fmt != "atlas":
+            base, ext = os.path.splitext(path)
+            variants = [ExportVariant(f"{base}_{w}x{h}{ext}", fmt, (w, h), cols, None, lossless, quality) for w, h in sizes]
+            success = bool(self.exporter.export_variants(variants, frame_indices, fps, self.ui.set_progress))
+        elif fmt == "atlas":
+            clips = self._parse_animation_list(self.ui.animations_input.text(), self.video_loader.frame_count, fps)
+            if not clips: clips = [AtlasClip("default", frame_indices, fps)]
+            success = self.exporter.export_atlas(path, clips, cols, self.ui.set_progress)
+        elif fmt == "spritesheet":
+            target = self.ui.decimate_frames_spin.value()
+            max_sheet = next(iter(self._parse_size_list(self.ui.max_sheet_input.text())), None)
+            if target or max_sheet:
+                success = self.exporter.export_decimated_spritesheet(path, frame_indices, fps, target, max_sheet, cols, self.ui.set_progress)
+            else:
+                success = self.exporter.export_spritesheet(path, frame_indices, cols, self.ui.set_progress)
+        elif fmt == "webp":
+            success = self.exporter.export_webp(path, frame_indices, fps, lossless, quality, self.ui.set_progress)
+        elif fmt == "apng":
+            success = self.exporter.export_apng(path, frame_indices, fps, lossless, quality, self.ui.set_progress)
+        elif fmt == "gif":
             success = self.exporter.export_gif(path, frame_indices, fps, self.ui.set_progress)
-        elif "MP4" in fmt_str:
+        else:
             success = self.exporter.export_mp4(path, frame_indices, fps, self.ui.set_progress)
             
         self.ui.set_progress(100)
         self.ui.export_button.setEnabled(True)
 
+    @property
+    def file_opener(self):
+        if self._file_opener is None:
+            from app.file_opener import AsyncFileOpener
+            self._file_opener = AsyncFileOpener()
+            self._file_opener.metadata_ready.connect(self.on_file_metadata)
+            self._file_opener.opened.connect(self.on_file_opened)
+            self._file_opener.failed.connect(self.on_file_failed)
+        return self._file_opener
+
     def handle_open_file(self, file_path: str):
-        if self.video_loader.open_file(file_path):
-            count = self.video_loader.frame_count
-            w, h = self.video_loader.width, self.video_loader.height
-            self.ui.setup_video_controls(count, w, h)
-            self.current_frame_index = 0
-            self.start_frame = 0
-            self.end_frame = count - 1
-            self.seek_to_frame(0)
-            interval = max(16, int(1000 / max(1, self.video_loader.fps)))
-            self.playback_timer.setInterval(interval)
+        # Opening and probing run on a worker thread; a newer open cancels this one
+        self.ui.play_button.setChecked(False)
+        self.file_opener.open(file_path)
+        self.ui.set_file_info(f"Loading {os.path.basename(file_path)}...")
+
+    def on_file_metadata(self, token, file_path, info):
+        if not self.file_opener.is_current(token): return
+        # Drop the previous file now so nothing seeks it under the new controls
+        self.video_loader.close()
+        count, w, h, fps = info["frame_count"], info["width"], info["height"], info["fps"]
+        self.ui.set_file_info(f"{os.path.basename(file_path)}\n{w}x{h}, {fps:.2f} FPS, {count} frames\nDecoding first frame...")
+        self.ui.setup_video_controls(count, w, h)
+        self.current_frame_index = 0
+        self.start_frame = 0
+        self.end_frame = count - 1
+
+    def on_file_opened(self, token, file_path, cap, info, first_frame):
+        if not self.file_opener.is_current(token):
+            cap.release()
+            return
+        self.video_loader.attach(file_path, cap, info, first_frame)
+        self.ui.set_file_info(f"{os.path.basename(file_path)}\n{info['width']}x{info['height']}, {info['fps']:.2f} FPS, {info['frame_count']} frames")
+        self.seek_to_frame(0)
+        interval = max(16, int(1000 / max(1, self.video_loader.fps)))
+        self.playback_timer.setInterval(interval)
+
+    def on_file_failed(self, token, file_path):
+        if not self.file_opener.is_current(token): return
+        self.ui.set_file_info(f"Could not open {os.path.basename(file_path)}")
 
     def on_scrub_slider_moved(self, index: int):
         if self.playback_timer.isActive():
             self.seek_to_frame(index)
+            self.playback_clock.anchor(index)
         else:
             self.pending_scrub_index = index
             self.scrub_timer.start(15)
@@ -122,6 +408,12 @@ class SpriteSpiteApp:
     def perform_scrub(self):
         self.seek_to_frame(self.pending_scrub_index)
 
+    def _update_stage_plan(self):
+        p = self.processor
+        w = max(1, self.video_loader.width - (p.margin_left + p.margin_right if p.use_crop else 0))
+        h = max(1, self.video_loader.height - (p.margin_top + p.margin_bottom if p.use_crop else 0))
+        self.ui.set_stage_plan(p.describe_plan(w, h) if (p.use_chroma and p.use_resize) else "")
+
     def seek_to_frame(self, index: int):
         self.current_frame_index = index
         frame = self.video_loader.get_frame(index)
@@ -131,14 +423,17 @@ class SpriteSpiteApp:
 
     def update_crop(self, left, top, right, bottom):
         self.processor.set_crop_margins(left, top, right, bottom)
+        self._update_stage_plan()
         self.seek_to_frame(self.current_frame_index)
 
-    def update_chroma(self, enabled, color, tolerance, edge_trim):
-        self.processor.set_chroma_settings(enabled, color, tolerance, edge_trim)
+    def update_chroma(self, enabled, color, tolerance, edge_trim, feather):
+        self.processor.set_chroma_settings(enabled, color, tolerance, edge_trim, feather)
+        self._update_stage_plan()
         self.seek_to_frame(self.current_frame_index)
 
     def update_resize(self, enabled, w, h):
         self.processor.set_resize(enabled, w, h)
+        self._update_stage_plan()
         self.seek_to_frame(self.current_frame_index)
 
     def update_compression(self, max_colors):
@@ -149,26 +444,60 @@ class SpriteSpiteApp:
         self.start_frame, self.end_frame = start, end
         if self.current_frame_index < start or self.current_frame_index > end:
             self.seek_to_frame(start)
+        if self.playback_timer.isActive():
+            self.playback_clock.start(self.current_frame_index, self.video_loader.fps, start, end)
 
     def toggle_playback(self, playing):
         if playing:
             self.ui.play_button.setText("Pause")
+            start = self.current_frame_index
+            if start < self.start_frame or start >= self.end_frame: start = self.start_frame
+            self.playback_clock.start(start, self.video_loader.fps, self.start_frame, self.end_frame)
             self.playback_timer.start()
         else:
             self.ui.play_button.setText("Play")
             self.playback_timer.stop()
+            self.ui.set_playback_stats("")
 
     def next_frame(self):
-        next_idx = self.current_frame_index + 1
-        if next_idx > self.end_frame: next_idx = self.start_frame
+        # Show whichever frame is due now; frames we couldn't render in time are skipped
+        clock = self.playback_clock
+        next_idx = clock.due_frame()
+        if next_idx == clock.last_shown: return
         self.seek_to_frame(next_idx)
+        clock.record_shown(next_idx)
+        self.ui.set_playback_stats(f"{clock.measured_fps:.1f} / {clock.fps:.1f} fps, {clock.dropped} dropped")
 
     def run(self):
         self.ui.show()
 
 def main():
-    app = QApplication(sys.argv)
+    report = "--startup-report" in sys.argv
+    benchmark = "--startup-benchmark" in sys.argv
+    # --startup-budget=MS makes the benchmark exit non-zero if first paint is slower
+    budget = next((float(a.split("=", 1)[1]) for a in sys.argv if a.startswith("--startup-budget=")), None)
+    argv = [a for a in sys.argv if a not in ("--startup-report", "--startup-benchmark") and not a.startswith("--startup-budget=")]
+    startup = StartupTimer(_T0)
+    startup.mark("imports")
+    app = QApplication(argv)
     spritespite = SpriteSpiteApp()
+    startup.mark("window_built")
+
+    def backend_ready():
+        startup.mark("backend_ready")
+        if report or benchmark:
+            print(startup.report(), flush=True)
+        if benchmark:
+            over = budget is not None and startup.marks.get("first_paint", float("inf")) > budget
+            if over: print(f"First paint exceeded budget of {budget:.0f} ms", flush=True)
+            app.exit(1 if over else 0)
+
+    # Signals emitted from the warm-up thread are queued back onto the GUI thread
+    startup.backend_loaded.connect(backend_ready)
+    startup.first_painted.connect(
+        lambda: spritespite.warm_up_backend(startup.backend_loaded.emit),
+        Qt.ConnectionType.QueuedConnection)
+    spritespite.ui.installEventFilter(startup)
     spritespite.run()
     sys.exit(app.exec())
 
@@ -0,0 +1,69 @@
+"""Wall-clock playback scheduling for the preview."""
+
+import time
+from collections import deque
+
+
+class PlaybackClock:
+    """Maps wall-clock time to the frame that should be on screen.
+
+    The preview asks for the due frame on every timer tick instead of stepping
+    one frame at a time, so when decoding and processing fall behind, frames
+    are skipped and the animation keeps its real speed.
+    """
+
+    def __init__(self, clock=time.perf_counter, window=1.0):
+        self._clock = clock
+        self.window = window
+        self.fps = 0.0
+        self.first = 0
+        self.last = 0
+        self._anchor_time = 0.0
+        self._anchor_frame = 0
+        self._last_shown = None
+        self._render_times = deque()
+        self.dropped = 0
+
+    def start(self, frame, fps, first, last):
+        self.fps = max(1, float(fps))  # 0 FPS metadata would freeze playback
+        self.first, self.last = first, max(first, last)
+        self.dropped = 0
+        self._render_times.clear()
+        self.anchor(frame)
+
+    def anchor(self, frame):
+        """Restart timing from `frame` (after a scrub or range change)."""
+        self._anchor_time = self._clock()
+        self._anchor_frame = min(max(frame, self.first), self.last)
+        self._last_shown = None
+
+    def due_frame(self) -> int:
+        length = self.last - self.first + 1
+        elapsed = int((self._clock() - self._anchor_time) * self.fps)
+        return self.first + (self._anchor_frame - self.first + elapsed) % length
+
+    def frames_behind(self, frame) -> int:
+        # Frames skipped between the previously shown frame and this one
+        if self._last_shown is None:
+            return 0
+        length = self.last - self.first + 1
+        return max(0, (frame - self._last_shown) % length - 1)
+
+    @property
+    def last_shown(self):
+        return self._last_shown
+
+    def record_shown(self, frame):
+        self.dropped += self.frames_behind(frame)
+        self._last_shown = frame
+        now = self._clock()
+        self._render_times.append(now)
+        while self._render_times and now - self._render_times[0] > self.window:
+            self._render_times.popleft()
+
+    @property
+    def measured_fps(self) -> float:
+        if len(self._render_times) < 2:
+            return 0.0
+        span = self._render_times[-1] - self._render_times[0]
+        return (len(self._render_times) - 1) / span if span > 0 else 0.0
@@ -1,3 +1,4 @@
+import itertools
 import numpy as np
 import cv2
 from PIL import Image
@@ -15,6 +16,7 @@ class ImageProcessor:
         self.target_color_rgb = (0, 255, 0)
         self.tolerance = 30
         self.edge_trim = 0
+        self.feather = 0
         
         # Resizing
         self.resize_w = 0
@@ -23,6 +25,11 @@ class ImageProcessor:
         
         # Compression (Color Quantization)
         self.max_colors = 256
+        
+        # Stage planning: key at reduced resolution when downscaling heavily
+        self.fast_downscale_key = True
+        self.key_supersample = 2      # key at this multiple of the output size
+        self.key_first_ratio = 0.25   # only reorder when keying would touch <= 25% of the pixels
 
     def set_crop_margins(self, left, top, right, bottom):
         self.margin_left = left
@@ -31,11 +38,12 @@ class ImageProcessor:
         self.margin_bottom = bottom
         self.use_crop = (left > 0 or top > 0 or right > 0 or bottom > 0)
 
-    def set_chroma_settings(self, enabled, color_rgb, tolerance, edge_trim):
+    def set_chroma_settings(self, enabled, color_rgb, tolerance, edge_trim, feather=0):
         self.use_chroma = enabled
         self.target_color_rgb = color_rgb
         self.tolerance = tolerance
         self.edge_trim = edge_trim
+        self.feather = feather
 
     def set_resize(self, enabled, w, h):
         self.use_resize = enabled
@@ -45,7 +53,125 @@ class ImageProcessor:
     def set_compression(self, max_colors):
         self.max_colors = max_colors
 
+    def settings_key(self) -> tuple:
+        # Everything that affects process_frame output; used as a cache key
+        return (
+            (self.use_crop, self.margin_left, self.margin_top, self.margin_right, self.margin_bottom),
+            (self.use_chroma, tuple(self.target_color_rgb), self.tolerance, self.edge_trim, self.feather) if self.use_chroma else (False,),
+            (self.resize_w, self.resize_h) if self.use_resize else (0, 0),
+            self.max_colors,
+            (self.fast_downscale_key, self.key_supersample, self.key_first_ratio),
+        )
+
+    def _output_size(self):
+        if self.use_resize and self.resize_w > 0 and self.resize_h > 0:
+            return (self.resize_w, self.resize_h)
+        return None
+
+    def frame_size(self, src_w, src_h):
+        # (w, h) of process_frame's output for a src_w x src_h frame
+        size = self._output_size()
+        if size: return size
+        if not self.use_crop: return (src_w, src_h)
+        return (max(1, src_w - self.margin_left - self.margin_right), max(1, src_h - self.margin_top - self.margin_bottom))
+
+    def plan_stages(self, src_w, src_h, out_size=None, allow_resize_first=True) -> dict:
+        # Keying cost scales with pixels, so for big downscales key at key_supersample x the output size
+        out_size = out_size or self._output_size()
+        plan = {"resize_first": False, "key_size": (src_w, src_h), "cost_ratio": 1.0, "scale": 1.0}
+        if not (allow_resize_first and self.use_chroma and out_size):
+            return plan
+        # One scale for both axes, so trim and feather distances stay isotropic
+        scale = min(1.0, max(out_size[0] * self.key_supersample / max(1, src_w),
+                             out_size[1] * self.key_supersample / max(1, src_h)))
+        key_w, key_h = max(1, round(src_w * scale)), max(1, round(src_h * scale))
+        ratio = (key_w * key_h) / max(1, src_w * src_h)
+        if self.fast_downscale_key and ratio <= self.key_first_ratio:
+            plan.update(resize_first=True, key_size=(key_w, key_h), cost_ratio=ratio, scale=scale)
+        return plan
+
+    def describe_plan(self, src_w, src_h) -> str:
+        plan = self.plan_stages(src_w, src_h)
+        if not plan["resize_first"]:
+            return "Keying at full resolution"
+        w, h = plan["key_size"]
+        return f"Keying at {w}x{h} (~{plan['cost_ratio'] * 100:.1f}% of full-res cost)"
+
+    def _key_mask(self, rgb: np.ndarray) -> np.ndarray:
+        # Raw foreground (255) / background (0) mask from the HSV key range
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+        target_np = np.uint8([[self.target_color_rgb]])
+        target_hsv = cv2.cvtColor(target_np, cv2.COLOR_RGB2HSV)[0][0]
+        
+        lower = np.array([
+            max(0, int(target_hsv[0]) - self.tolerance),
+            max(0, int(target_hsv[1]) - self.tolerance * 2),
+            max(20, int(target_hsv[2]) - self.tolerance * 3)
+        ], dtype=np.uint8)
+        upper = np.array([min(180, int(target_hsv[0]) + self.tolerance), 255, 255], dtype=np.uint8)
+        
+        mask = cv2.inRange(hsv, lower, upper)
+        return cv2.bitwise_not(mask)
+
+    def _matte(self, silhouette: np.ndarray, edge_trim, feather) -> np.ndarray:
+        # One distance transform: trim is a threshold and feather a ramp on it, both fractional-pixel safe
+        if edge_trim <= 0 and feather <= 0:
+            return silhouette
+        dist = cv2.distanceTransform(silhouette, cv2.DIST_L2, 5)
+        if feather <= 0:
+            return cv2.threshold(dist, edge_trim, 255, cv2.THRESH_BINARY)[1].astype(np.uint8)
+        # (dist - trim) / feather * 255, saturated to 0..255 by the CV_8U output
+        gain = 255.0 / feather
+        return cv2.addWeighted(dist, gain, dist, 0, -edge_trim * gain, dtype=cv2.CV_8U)
+
+    def frame_bounds(self, frame: np.ndarray):
+        # Box (x1, y1, x2, y2) of the raw key mask, before trim/feather so it never clips the silhouette
+        x, y, w, h = cv2.boundingRect(self._key_mask(frame))
+        return (x, y, x + w, y + h) if w and h else None
+
+    @staticmethod
+    def union_bounds(boxes):
+        boxes = [b for b in boxes if b]
+        if not boxes: return None
+        return min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)
+
+    def foreground_bounds(self, frames):
+        if not self.use_chroma: return None
+        return self.union_bounds(self.frame_bounds(f) for f in frames if f is not None)
+
+    def crop_margins(self, bounds, img_w, img_h, padding=0):
+        x1, y1, x2, y2 = bounds
+        return (max(0, x1 - padding), max(0, y1 - padding), max(0, img_w - x2 - padding), max(0, img_h - y2 - padding))
+
+    def auto_crop(self, frames, padding=0):
+        # Crop to the union foreground bounds plus padding; returns the margins or None
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return None
+        bounds = self.foreground_bounds(itertools.chain([first], frames))
+        if bounds is None:
+            return None
+        margins = self.crop_margins(bounds, first.shape[1], first.shape[0], padding)
+        self.set_crop_margins(*margins)
+        return margins
+
     def process_frame(self, frame: np.ndarray) -> np.ndarray:
+        size = self._output_size()
+        return self.finish_frame(self.prepare_frame(frame, size), size, self.max_colors)
+
+    def process_variants(self, frame: np.ndarray, variants) -> list:
+        # Crop and key once (planned for the largest size), then resize/quantize per variant; None keeps the cropped size
+        sizes = [size for size, _ in variants]
+        if not sizes or any(size is None for size in sizes):
+            # An unsized branch needs the full cropped frame, whatever the processor's own resize is
+            base = self.prepare_frame(frame, allow_resize_first=False)
+        else:
+            base = self.prepare_frame(frame, (max(w for w, _ in sizes), max(h for _, h in sizes)))
+        return [self.finish_frame(base, size, colors) for size, colors in variants]
+
+    def prepare_frame(self, frame: np.ndarray, out_size=None, allow_resize_first=True) -> np.ndarray:
+        # Crop and chroma key, shared by every output size
         result = frame
         
         # 1. Apply Crop
@@ -57,50 +183,44 @@ class ImageProcessor:
             y2 = max(y1 + 1, min(img_h - self.margin_bottom, img_h))
             result = result[y1:y2, x1:x2].copy()
 
+        # 1b. Downscale before keying when the plan says it's much cheaper
+        edge_trim, feather = self.edge_trim, self.feather
+        plan = self.plan_stages(result.shape[1], result.shape[0], out_size, allow_resize_first)
+        if plan["resize_first"]:
+            result = cv2.resize(result, plan["key_size"], interpolation=cv2.INTER_AREA)
+            edge_trim, feather = edge_trim * plan["scale"], feather * plan["scale"]
+
         # 2. Apply Chroma Key (convert to RGBA)
         if self.use_chroma:
-            hsv = cv2.cvtColor(result, cv2.COLOR_RGB2HSV)
-            target_np = np.uint8([[self.target_color_rgb]])
-            target_hsv = cv2.cvtColor(target_np, cv2.COLOR_RGB2HSV)[0][0]
-            
-            lower = np.array([
-                max(0, int(target_hsv[0]) - self.tolerance),
-                max(0, int(target_hsv[1]) - self.tolerance * 2),
-                max(20, int(target_hsv[2]) - self.tolerance * 3)
-            ], dtype=np.uint8)
-            upper = np.array([min(180, int(target_hsv[0]) + self.tolerance), 255, 255], dtype=np.uint8)
-            
-            mask = cv2.inRange(hsv, lower, upper)
-            foreground_mask = cv2.bitwise_not(mask)
+            foreground_mask = self._key_mask(result)
             contours, _ = cv2.findContours(foreground_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
             solid_foreground = np.zeros_like(foreground_mask)
             cv2.drawContours(solid_foreground, contours, -1, 255, thickness=cv2.FILLED)
             
-            if self.edge_trim > 0:
-                kernel = np.ones((3, 3), np.uint8)
-                solid_foreground = cv2.erode(solid_foreground, kernel, iterations=self.edge_trim)
-            
             rgba = cv2.cvtColor(result, cv2.COLOR_RGB2RGBA)
-            rgba[:, :, 3] = solid_foreground
+            rgba[:, :, 3] = self._matte(solid_foreground, edge_trim, feather)
             result = rgba
+        return result
 
+    def finish_frame(self, result: np.ndarray, size=None, max_colors=256) -> np.ndarray:
+        # Resize and quantize a prepared frame for one output
         # 3. Apply Resize
-        if self.use_resize and self.resize_w > 0 and self.resize_h > 0:
+        if size and (result.shape[1], result.shape[0]) != tuple(size):
             # We use INTER_AREA for downscaling as it's less prone to moiré
-            result = cv2.resize(result, (self.resize_w, self.resize_h), interpolation=cv2.INTER_AREA)
+            result = cv2.resize(result, tuple(size), interpolation=cv2.INTER_AREA)
         
         # 4. Apply Compression (Color Quantization)
-        if self.max_colors < 256:
+        if max_colors < 256:
             if result.shape[2] == 4:
                 pil_img = Image.fromarray(result, 'RGBA')
                 alpha = pil_img.getchannel('A')
-                quantized = pil_img.convert('RGB').quantize(colors=self.max_colors)
+                quantized = pil_img.convert('RGB').quantize(colors=max_colors)
                 result_pil = quantized.convert('RGBA')
                 result_pil.putalpha(alpha)
                 result = np.array(result_pil)
             else:
                 pil_img = Image.fromarray(result, 'RGB')
-                result = np.array(pil_img.quantize(colors=self.max_colors).convert('RGB'))
+                result = np.array(pil_img.quantize(colors=max_colors).convert('RGB'))
                 
         return result
\ No newline at end of file
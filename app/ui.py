@@ -7,7 +7,6 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QBrush
 from PyQt6.QtCore import Qt, pyqtSignal, QRect, QPoint, QSize
-import numpy as np
 
 class MultiFrameDialog(QDialog):
     def __init__(self, parent, video_loader):
@@ -177,12 +176,14 @@ class MainWindow(QMainWindow):
     frame_changed = pyqtSignal(int)
     range_changed = pyqtSignal(int, int)
     crop_changed = pyqtSignal(int, int, int, int)
-    chroma_changed = pyqtSignal(bool, tuple, int, int)
+    chroma_changed = pyqtSignal(bool, tuple, int, int, int)
     export_requested = pyqtSignal(str, int)
     add_current_frame_requested = pyqtSignal()
     multi_select_requested = pyqtSignal()
     compression_changed = pyqtSignal(int)
     resize_changed = pyqtSignal(bool, int, int)
+    auto_crop_requested = pyqtSignal(int)
+    loop_search_requested = pyqtSignal(int, int)
 
     def __init__(self, on_open_file_callback):
         super().__init__()
@@ -204,6 +205,10 @@ class MainWindow(QMainWindow):
         self.open_button = QPushButton("Open Video/GIF")
         self.open_button.clicked.connect(self._handle_open_file)
         left_layout.addWidget(self.open_button)
+        self.file_info_label = QLabel("No file loaded")
+        self.file_info_label.setWordWrap(True)
+        self.file_info_label.setStyleSheet("color: gray;")
+        left_layout.addWidget(self.file_info_label)
         
         # Selection Group
         sel_group = QGroupBox("Frame Selection")
@@ -221,6 +226,26 @@ class MainWindow(QMainWindow):
         self.end_frame_spin = QSpinBox()
         range_fl.addRow("Start:", self.start_frame_spin)
         range_fl.addRow("End:", self.end_frame_spin)
+        for s in (self.start_frame_spin, self.end_frame_spin):
+            s.valueChanged.connect(self._handle_range_change)
+        loop_len_layout = QHBoxLayout()
+        self.loop_min_spin = QSpinBox()
+        self.loop_min_spin.setRange(2, 100000)
+        self.loop_min_spin.setValue(12)
+        self.loop_max_spin = QSpinBox()
+        self.loop_max_spin.setRange(2, 100000)
+        self.loop_max_spin.setValue(120)
+        loop_len_layout.addWidget(self.loop_min_spin)
+        loop_len_layout.addWidget(QLabel("to"))
+        loop_len_layout.addWidget(self.loop_max_spin)
+        range_fl.addRow("Loop length:", loop_len_layout)
+        self.find_loop_button = QPushButton("Find Loops")
+        self.find_loop_button.clicked.connect(lambda: self.loop_search_requested.emit(self.loop_min_spin.value(), self.loop_max_spin.value()))
+        range_fl.addRow(self.find_loop_button)
+        self.loop_combo = QComboBox()
+        self.loop_combo.setEnabled(False)
+        self.loop_combo.activated.connect(self._handle_loop_selected)
+        range_fl.addRow("Loops:", self.loop_combo)
         sel_layout.addWidget(self.range_widget)
         self.individual_widget = QWidget()
         self.individual_widget.setVisible(False)
@@ -270,6 +295,15 @@ class MainWindow(QMainWindow):
         self.reset_crop_button.clicked.connect(self.reset_crop)
         self.crop_widgets.append(self.reset_crop_button)
         crop_layout.addRow(self.reset_crop_button)
+        self.auto_crop_pad_spin = QSpinBox()
+        self.auto_crop_pad_spin.setRange(0, 999)
+        self.auto_crop_pad_spin.setToolTip("Padding added around the detected subject")
+        self.auto_crop_button = QPushButton("Auto")
+        self.auto_crop_button.setToolTip("Crop to the keyed subject across the selected frames (needs Chroma Key)")
+        self.auto_crop_button.clicked.connect(lambda: self.auto_crop_requested.emit(self.auto_crop_pad_spin.value()))
+        self.crop_widgets += [self.auto_crop_pad_spin, self.auto_crop_button]
+        crop_layout.addRow("Pad:", self.auto_crop_pad_spin)
+        crop_layout.addRow(self.auto_crop_button)
         self.crop_group.setLayout(crop_layout)
         crop_resize_layout.addWidget(self.crop_group)
         
@@ -297,6 +331,10 @@ class MainWindow(QMainWindow):
         manual_resize_layout.addRow("W:", self.resize_w_spin)
         manual_resize_layout.addRow("H:", self.resize_h_spin)
         resize_layout.addLayout(manual_resize_layout)
+        self.stage_plan_label = QLabel("")
+        self.stage_plan_label.setWordWrap(True)
+        self.stage_plan_label.setStyleSheet("color: gray; font-size: 10px;")
+        resize_layout.addWidget(self.stage_plan_label)
         self.resize_group.setLayout(resize_layout)
         crop_resize_layout.addWidget(self.resize_group)
         left_layout.addWidget(crop_resize_container)
@@ -326,10 +364,16 @@ class MainWindow(QMainWindow):
         chroma_layout.addWidget(self.tolerance_slider)
         chroma_layout.addWidget(QLabel("Edge Trim:"))
         self.edge_trim_slider = QSlider(Qt.Orientation.Horizontal)
-        self.edge_trim_slider.setRange(0, 10)
+        self.edge_trim_slider.setRange(0, 50)
         self.edge_trim_slider.setValue(0)
         self.edge_trim_slider.valueChanged.connect(self._handle_chroma_change)
         chroma_layout.addWidget(self.edge_trim_slider)
+        chroma_layout.addWidget(QLabel("Edge Feather:"))
+        self.feather_slider = QSlider(Qt.Orientation.Horizontal)
+        self.feather_slider.setRange(0, 20)
+        self.feather_slider.setValue(0)
+        self.feather_slider.valueChanged.connect(self._handle_chroma_change)
+        chroma_layout.addWidget(self.feather_slider)
         self.chroma_group.setLayout(chroma_layout)
         left_layout.addWidget(self.chroma_group)
 
@@ -337,14 +381,57 @@ class MainWindow(QMainWindow):
         export_group = QGroupBox("Export")
         export_layout = QVBoxLayout()
         self.export_type_combo = QComboBox()
-        self.export_type_combo.addItems(["Sprite Sheet (PNG)", "Animated GIF", "MP4 Video"])
+        self.export_type_combo.addItems(["Sprite Sheet (PNG)", "Godot Atlas (PNG + TRES)", "Animated GIF", "Animated WebP", "Animated PNG (APNG)", "MP4 Video"])
+        self.export_type_combo.currentTextChanged.connect(self._handle_export_type_change)
         export_layout.addWidget(QLabel("Format:"))
         export_layout.addWidget(self.export_type_combo)
+        self.animations_widget = QWidget()
+        self.animations_widget.setVisible(False)
+        anim_layout = QVBoxLayout(self.animations_widget)
+        anim_layout.setContentsMargins(0, 0, 0, 0)
+        anim_layout.addWidget(QLabel("Animations (name: frames @fps; ...):"))
+        self.animations_input = QLineEdit()
+        self.animations_input.setPlaceholderText("e.g. idle: 0-11 @12; run: 12-23 @24")
+        anim_layout.addWidget(self.animations_input)
+        export_layout.addWidget(self.animations_widget)
+        self.anim_quality_widget = QWidget()
+        self.anim_quality_widget.setVisible(False)
+        quality_layout = QHBoxLayout(self.anim_quality_widget)
+        quality_layout.setContentsMargins(0, 0, 0, 0)
+        self.lossless_check = QCheckBox("Lossless")
+        self.lossless_check.setChecked(True)
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(1, 100)
+        self.quality_spin.setValue(80)
+        self.quality_spin.setEnabled(False)
+        self.lossless_check.toggled.connect(lambda b: self.quality_spin.setEnabled(not b))
+        quality_layout.addWidget(self.lossless_check)
+        quality_layout.addWidget(QLabel("Quality:"))
+        quality_layout.addWidget(self.quality_spin)
+        export_layout.addWidget(self.anim_quality_widget)
+        self.decimate_widget = QWidget()
+        decimate_layout = QFormLayout(self.decimate_widget)
+        decimate_layout.setContentsMargins(0, 0, 0, 0)
+        self.decimate_frames_spin = QSpinBox()
+        self.decimate_frames_spin.setRange(0, 10000)
+        self.decimate_frames_spin.setSpecialValueText("Off")
+        self.decimate_frames_spin.setToolTip("Keep only this many frames, chosen to preserve the most motion")
+        decimate_layout.addRow("Max Frames:", self.decimate_frames_spin)
+        self.max_sheet_input = QLineEdit()
+        self.max_sheet_input.setPlaceholderText("e.g. 2048 or 2048x1024 (optional)")
+        decimate_layout.addRow("Max Sheet:", self.max_sheet_input)
+        export_layout.addWidget(self.decimate_widget)
         self.cols_spin = QSpinBox()
         self.cols_spin.setRange(0, 100)
         self.cols_spin.setSpecialValueText("Auto")
         export_layout.addWidget(QLabel("Columns:"))
         export_layout.addWidget(self.cols_spin)
+        export_layout.addWidget(QLabel("Output Sizes (optional):"))
+        self.sizes_input = QLineEdit()
+        self.sizes_input.setPlaceholderText("e.g. 32, 64, 128x96 (one file per size)")
+        # Size variants are written without per-frame durations, so frame budgets don't apply to them
+        self.sizes_input.textChanged.connect(lambda t: self.decimate_widget.setEnabled(not t.strip()))
+        export_layout.addWidget(self.sizes_input)
         export_layout.addWidget(QLabel("Color Limit (Compression):"))
         self.compression_slider = QSlider(Qt.Orientation.Horizontal)
         self.compression_slider.setRange(2, 256)
@@ -381,6 +468,9 @@ class MainWindow(QMainWindow):
         self.current_frame_label = QLabel("Frame: 0/0")
         bottom_nav.addWidget(self.current_frame_label)
         bottom_nav.addStretch()
+        self.playback_stats_label = QLabel("")
+        self.playback_stats_label.setStyleSheet("color: gray;")
+        bottom_nav.addWidget(self.playback_stats_label)
         self.play_button = QPushButton("Play")
         self.play_button.setCheckable(True)
         bottom_nav.addWidget(self.play_button)
@@ -392,6 +482,8 @@ class MainWindow(QMainWindow):
         p, _ = QFileDialog.getOpenFileName(self, "Open Video", "", "Video (*.mp4 *.gif *.mkv *.webm);;All (*)")
         if p: self.on_open_file_callback(p)
 
+    def set_crop_margins(self, l, t, r, b): self._handle_mouse_crop(l, t, r, b)
+
     def _handle_mouse_crop(self, l, t, r, b):
         for s, v in zip([self.crop_left_spin, self.crop_top_spin, self.crop_right_spin, self.crop_bottom_spin], [l, t, r, b]):
             s.blockSignals(True); s.setValue(v); s.blockSignals(False)
@@ -408,7 +500,7 @@ class MainWindow(QMainWindow):
         self.pick_color_button.setChecked(False); self._handle_chroma_change()
 
     def _handle_chroma_change(self):
-        self.chroma_changed.emit(self.chroma_group.isChecked(), self.chroma_color, self.tolerance_slider.value(), self.edge_trim_slider.value())
+        self.chroma_changed.emit(self.chroma_group.isChecked(), self.chroma_color, self.tolerance_slider.value(), self.edge_trim_slider.value(), self.feather_slider.value())
 
     def _handle_resize_preset(self, text):
         if text == "Orig": self.resize_group.setChecked(False)
@@ -434,6 +526,7 @@ class MainWindow(QMainWindow):
         self.end_frame_spin.setRange(0, c - 1); self.end_frame_spin.setValue(c - 1)
         for s, m in zip([self.crop_left_spin, self.crop_top_spin, self.crop_right_spin, self.crop_bottom_spin], [w, h, w, h]): s.setRange(0, m - 1)
         self.resize_w_spin.setValue(w); self.resize_h_spin.setValue(h); self.reset_crop()
+        self.loop_combo.clear(); self.loop_combo.setEnabled(False)
 
     def reset_crop(self):
         for s in [self.crop_left_spin, self.crop_top_spin, self.crop_right_spin, self.crop_bottom_spin]: s.setValue(0)
@@ -448,6 +541,11 @@ class MainWindow(QMainWindow):
         self.comp_label.setText("Mode: 32-bit (Original)" if val >= 256 else f"Mode: 8-bit ({val} colors)")
         self.compression_changed.emit(val)
 
+    def _handle_export_type_change(self, text):
+        self.animations_widget.setVisible("Atlas" in text)
+        self.anim_quality_widget.setVisible("WebP" in text or "APNG" in text)
+        self.decimate_widget.setVisible("Sprite" in text)
+
     def _handle_export(self): self.export_requested.emit(self.export_type_combo.currentText(), self.cols_spin.value())
 
     def update_preview(self, full, proc, cur, tot):
@@ -459,4 +557,30 @@ class MainWindow(QMainWindow):
         m = (self.crop_left_spin.value(), self.crop_top_spin.value(), self.crop_right_spin.value(), self.crop_bottom_spin.value())
         self.preview_label.set_frame(to_pix(full), to_pix(proc), (full.shape[1], full.shape[0]), m, self.crop_group.isChecked())
 
+    def set_file_info(self, text): self.file_info_label.setText(text)
+
+    def set_playback_stats(self, text): self.playback_stats_label.setText(text)
+
+    def set_stage_plan(self, text): self.stage_plan_label.setText(text)
+
+    def set_loop_candidates(self, loops):
+        self.loop_combo.clear()
+        for loop in loops:
+            self.loop_combo.addItem(f"{loop['start']}-{loop['end']} ({loop['end'] - loop['start'] + 1} frames, seam {loop['score']:.2f})", (loop["start"], loop["end"]))
+        self.loop_combo.setEnabled(bool(loops))
+        if not loops: self.loop_combo.addItem("No loops found")
+        else: self._handle_loop_selected(0)
+
+    def _handle_loop_selected(self, index):
+        span = self.loop_combo.itemData(index)
+        if not span: return
+        self.range_radio.setChecked(True)
+        # Set both quietly and emit once, so playback re-anchors on the new loop only once
+        for spin, v in ((self.start_frame_spin, span[0]), (self.end_frame_spin, span[1])):
+            spin.blockSignals(True); spin.setValue(v); spin.blockSignals(False)
+        self._handle_range_change()
+
+    def _handle_range_change(self):
+        self.range_changed.emit(self.start_frame_spin.value(), self.end_frame_spin.value())
+
     def set_progress(self, v): self.progress_bar.setVisible(0 < v < 100); self.progress_bar.setValue(v)
\ No newline at end of file
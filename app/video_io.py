@@ -1,8 +1,19 @@
 import cv2
 import numpy as np
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional
 from functools import lru_cache
 
+def read_capture_info(cap) -> dict:
+    return {
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+
 class VideoLoader:
     def __init__(self, cache_size=100):
         self.cap = None
@@ -12,6 +23,7 @@ class VideoLoader:
         self.width = 0
         self.height = 0
         self.current_pos = -1 # Track internal head position
+        self.max_grab_skip = 8 # Forward gaps up to this are skipped with grab() instead of a seek
         
         # Simple manual cache for decoded frames
         self.cache = {}
@@ -28,14 +40,27 @@ class VideoLoader:
         if not self.cap.isOpened():
             return False
         
-        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.attach(file_path, self.cap)
+        return True
+
+    def attach(self, file_path: str, cap, info=None, first_frame=None):
+        # Adopt a capture opened elsewhere; first_frame is frame 0 in RGB, already read from it
+        if self.cap and self.cap is not cap:
+            self.cap.release()
+        info = info or read_capture_info(cap)
+        self.file_path = file_path
+        self.cap = cap
+        self.frame_count = info["frame_count"]
+        self.fps = info["fps"]
+        self.width = info["width"]
+        self.height = info["height"]
         self.current_pos = -1
         self.cache.clear()
         self.cache_order.clear()
-        return True
+        if first_frame is not None:
+            self.current_pos = 0
+            self.cache[0] = first_frame
+            self.cache_order.append(0)
 
     def get_frame(self, frame_index: int) -> Optional[np.ndarray]:
         if not self.cap or not self.cap.isOpened():
@@ -54,7 +79,14 @@ class VideoLoader:
         # 2. Optimized Seek
         # If we are already at the previous frame, we don't need to 'set' (which is slow)
         # We can just 'read' (which is fast)
-        if frame_index != self.current_pos + 1:
+        # Short forward jumps (e.g. playback dropping frames) are cheaper to 'grab' through
+        skip = frame_index - self.current_pos - 1
+        if 0 < skip <= self.max_grab_skip:
+            for _ in range(skip):
+                if not self.cap.grab():
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                    break
+        elif skip != 0:
             self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
         
         ret, frame = self.cap.read()
@@ -82,5 +114,93 @@ class VideoLoader:
         if self.cap:
             self.cap.release()
             self.cap = None
+        # Forget the file too, so nothing keys caches or opens readers for it after close
+        self.file_path = None
+        self.frame_count = 0
+        self.current_pos = -1
         self.cache.clear()
         self.cache_order.clear()
+
+
+
+class ParallelFrameReader:
+    # Decodes sorted frame segments on several captures of the same file, one per worker thread.
+    # Segments stay >= min_segment frames to amortise the keyframe seek each one starts with.
+    def __init__(self, file_path, workers=None, min_segment=48, max_gap=8):
+        self.file_path = file_path
+        self.workers = workers or max(1, min(8, os.cpu_count() or 1))
+        self.min_segment = min_segment
+        self.max_gap = max_gap
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return cv2.VideoCapture(self.file_path)
+
+    def _release(self, cap):
+        with self._lock:
+            if len(self._idle) < self.workers:
+                self._idle.append(cap)
+                return
+        cap.release()
+
+    def plan_segments(self, frame_indices, min_segment=None):
+        # At most `workers` segments; gaps up to max_gap are grabbed through, longer ones seeked
+        wanted = sorted(set(frame_indices))
+        if not wanted:
+            return []
+        min_segment = self.min_segment if min_segment is None else min_segment
+        size = max(min_segment, -(-len(wanted) // self.workers))
+        segments = [wanted[i:i + size] for i in range(0, len(wanted), size)]
+        # Fold a short tail into the previous segment rather than paying a seek for it
+        if len(segments) > 1 and len(segments[-1]) < min_segment // 2:
+            segments[-2].extend(segments.pop())
+        return segments
+
+    def _decode_segment(self, segment, process):
+        cap = self._acquire()
+        out = {}
+        try:
+            if not cap.isOpened():
+                return out
+            pos = None
+            for idx in segment:
+                if pos is None or idx - pos > self.max_gap:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+                    pos = idx
+                while pos < idx:
+                    if not cap.grab(): return out
+                    pos += 1
+                ret, frame = cap.read()
+                pos += 1
+                if not ret: return out
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                out[idx] = process(rgb) if process else rgb
+            return out
+        finally:
+            self._release(cap)
+
+    def read(self, frame_indices, process=None, progress_callback=None, min_segment=None):
+        # Frames (or process(frame) results) aligned with frame_indices; None where decoding failed
+        segments = self.plan_segments(frame_indices, min_segment)
+        results = {}
+        total = sum(len(seg) for seg in segments)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="spritespite-decode") as pool:
+            futures = {pool.submit(self._decode_segment, seg, process): seg for seg in segments}
+            # Progress is reported from the calling thread only
+            for fut in as_completed(futures):
+                results.update(fut.result())
+                done += len(futures[fut])
+                if progress_callback and total:
+                    progress_callback(int((done / total) * 100))
+        return [results.get(i) for i in frame_indices]
+
+    def close(self):
+        with self._lock:
+            for cap in self._idle:
+                cap.release()
+            self._idle.clear()